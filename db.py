@@ -0,0 +1,104 @@
+"""
+SQLite connections for the web app.
+
+Every worker thread gets its own connections instead of sharing one
+cursor across requests. The database is kept in WAL mode, so the read-only
+connections used by the GET routes keep reading while the weekly
+ingest writes.
+"""
+
+import sqlite3
+import threading
+
+DB_PATH = 'db.sqlite'
+# seconds a connection waits on a lock held by another connection
+BUSY_TIMEOUT = 10.0
+
+_local = threading.local()
+_wal_lock = threading.Lock()
+# databases this process switched to WAL mode
+_wal_paths = set()
+
+def connect(path=None, readonly=False):
+    """
+    Open a new connection to the database.
+
+    Parameters
+    ----------
+    path : str
+        Path to the database file. Default is None which uses DB_PATH.
+    readonly : bool
+        Open the database read-only. Writes through the connection
+        raise sqlite3.OperationalError.
+
+    Returns
+    -------
+    sqlite connection object
+    """
+    # read when called, so that a DB_PATH changed after import is used
+    path = DB_PATH if path is None else path
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT)
+
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    # the journal mode is stored in the database file, setting it again is a no-op
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+def enable_wal(path=None):
+    """
+    Switch the database to WAL mode. Needs to run before the first
+    read-only connection is opened, which `reader` takes care of.
+
+    Parameters
+    ----------
+    path : str
+        Path to the database file. Default is None which uses DB_PATH.
+    """
+    connect(path).close()
+
+def _thread_connection(key, readonly):
+    conn = getattr(_local, key, None)
+    if conn is None:
+        # readers only run concurrently with the ingest writer in WAL mode,
+        # switched on by the first connection of the process rather than on import
+        path = DB_PATH
+        if path not in _wal_paths:
+            with _wal_lock:
+                if path not in _wal_paths:
+                    enable_wal(path)
+                    _wal_paths.add(path)
+        conn = connect(path, readonly=readonly)
+        setattr(_local, key, conn)
+    return conn
+
+def reader():
+    """
+    Get the calling thread's read-only connection, opening it on first use.
+
+    Returns
+    -------
+    sqlite connection object
+    """
+    return _thread_connection("reader", True)
+
+def writer():
+    """
+    Get the calling thread's read-write connection, opening it on first use.
+
+    Returns
+    -------
+    sqlite connection object
+    """
+    return _thread_connection("writer", False)
+
+def close():
+    """
+    Close the calling thread's connections.
+    """
+    for key in ("reader", "writer"):
+        conn = getattr(_local, key, None)
+        if conn is not None:
+            conn.close()
+            setattr(_local, key, None)
@@ -6,6 +6,15 @@ see https://fivethirtyeight.com/methodology/how-our-nfl-predictions-work/
 
 import numpy as np
 
+# model constants, see the methodology link above
+K_FACTOR = 20 # recommended K-factor
+HOME_FIELD_ADVANTAGE = 48
+MEAN_ELO = 1505
+REGRESSION_TO_MEAN = 1/3 # fraction of the distance to the mean removed each pre-season
+TRAVEL_ELO_PER_MILE = 0.004
+MOV_CONSTANT = 2.2
+MOV_ELO_SCALE = 0.001
+
 def get_distance(teamA_lat, teamA_long, teamB_lat, teamB_long):
     """
     Calculates distance between team home locations using haversine formula.
@@ -38,7 +47,76 @@ def get_distance(teamA_lat, teamA_long, teamB_lat, teamB_long):
 
     return distance/1.609 # Miles
 
-def pregame_elo_shift(game_dict, cur):
+def travel_shifts(distance, home_field_advantage=HOME_FIELD_ADVANTAGE,
+                  travel_per_mile=TRAVEL_ELO_PER_MILE):
+    """
+    Convert travel distances into pregame elo shifts.
+
+    Parameters
+    ----------
+    distance : np.ndarray
+        Distances in miles between team home locations.
+    home_field_advantage : float
+        Elo value of playing at home.
+    travel_per_mile : float
+        Elo lost per mile travelled.
+
+    Returns
+    -------
+    home_shift : np.ndarray
+        Elo shift to the home team for a home game over `distance`.
+    travel_shift : np.ndarray
+        Elo lost by a team travelling `distance` to a neutral site game.
+    """
+    home_shift = home_field_advantage/2 + np.round(distance*travel_per_mile/2)
+    travel_shift = np.round(distance*travel_per_mile)
+    return home_shift, travel_shift
+
+def build_travel_table(cur, home_field_advantage=HOME_FIELD_ADVANTAGE,
+                       travel_per_mile=TRAVEL_ELO_PER_MILE):
+    """
+    Precompute the travel distances and pregame elo shifts between the home
+    locations of every pair of teams. Built once from the Teams table so that
+    `pregame_elo_shift` never needs to query the database.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+        Cursor for the current instance of sqlite database.
+    home_field_advantage : float
+        Elo value of playing at home.
+    travel_per_mile : float
+        Elo lost per mile travelled.
+
+    Returns
+    -------
+    dict[str: any]
+        {"team_index": {team name: index},
+         "ticker_index": {team ticker: index},
+         "distance": (n_teams, n_teams) array of distances in miles,
+         "home_shift": (n_teams, n_teams) array of the elo shift to home
+                       team i when hosting away team j,
+         "travel_shift": (n_teams, n_teams) array of the elo lost by team i
+                         when travelling to a neutral game at team j's home}
+    """
+    teams = cur.execute("""SELECT name, ticker, latitude, longitude
+                        FROM Teams ORDER BY id""").fetchall()
+    latitude = np.array([team[2] for team in teams], dtype=np.float64)
+    longitude = np.array([team[3] for team in teams], dtype=np.float64)
+
+    distance = get_distance(latitude[:, np.newaxis], longitude[:, np.newaxis],
+                            latitude[np.newaxis, :], longitude[np.newaxis, :])
+    home_shift, travel_shift = travel_shifts(distance, home_field_advantage, travel_per_mile)
+
+    return {
+        "team_index": {team[0]: idx for idx, team in enumerate(teams)},
+        "ticker_index": {team[1]: idx for idx, team in enumerate(teams)},
+        "distance": distance,
+        "home_shift": home_shift,
+        "travel_shift": travel_shift,
+    }
+
+def pregame_elo_shift(game_dict, travel_table):
     """
     Calculate the pregame elo shift for a given game.
 
@@ -50,8 +128,8 @@ def pregame_elo_shift(game_dict, cur):
               "away_team": team name,
               "neutral_dest": team ticker of home destination
               }
-    cur : sqlite db cursor
-        Cursor for the current instance of sqlite database.
+    travel_table : dict[str: any]
+        Precomputed travel table from `build_travel_table`.
 
     Returns
     -------
@@ -60,44 +138,53 @@ def pregame_elo_shift(game_dict, cur):
         home team. For example, add elo_shift to the home team and subtract 
         from the away team.
     """
-    home_team = cur.execute("SELECT latitude, longitude FROM Teams WHERE name = ? ", 
-                                (game_dict["home_team"],)).fetchall()[0]
-    away_team = cur.execute("SELECT latitude, longitude FROM Teams WHERE name = ? ", 
-                                (game_dict["away_team"],)).fetchall()[0]
+    home = travel_table["team_index"][game_dict["home_team"]]
+    away = travel_table["team_index"][game_dict["away_team"]]
 
-    elo_shift = 0
     # travel adjustment
     if game_dict["neutral_dest"] != 'None':
         # Neutral game, make no base adjustment. Adjust both teams for distance only.
-        neutral_lat, neutral_long = cur.execute("SELECT latitude, longitude FROM Teams WHERE ticker = ?", 
-                                  (game_dict["neutral_dest"],)).fetchall()[0]
-        home_travel_distance = get_distance(home_team[0],
-                                            home_team[1],
-                                            neutral_lat,
-                                            neutral_long)
-        away_travel_distance = get_distance(away_team[0],
-                                            away_team[1],
-                                            neutral_lat,
-                                            neutral_long)
-        home_team_shift = round(home_travel_distance*0.004)
-        away_team_shift = round(away_travel_distance*0.004)
-        elo_shift -= home_team_shift + away_team_shift
-    else:
-        distance = get_distance(home_team[0],
-                                home_team[1],
-                                away_team[0],
-                                away_team[1])
-        elo_shift += 48/2
-        elo_shift += round(distance*0.004/2)
+        dest = travel_table["ticker_index"][game_dict["neutral_dest"]]
+        return -(travel_table["travel_shift"][home, dest] + travel_table["travel_shift"][away, dest])
+    return travel_table["home_shift"][home, away]
+
+def pregame_elo_shift_batch(home_idx, away_idx, dest_idx, travel_table):
+    """
+    Calculate the pregame elo shift for many games at once.
 
-    return elo_shift
+    Parameters
+    ----------
+    home_idx : np.ndarray
+        Index of the home team of each game in the travel table.
+    away_idx : np.ndarray
+        Index of the away team of each game in the travel table.
+    dest_idx : np.ndarray
+        Index of the team whose home hosts each neutral game, -1 if
+        the game is not at a neutral site.
+    travel_table : dict[str: any]
+        Precomputed travel table from `build_travel_table`.
+
+    Returns
+    -------
+    np.ndarray
+        Pregame elo shift to the home team of each game, see `pregame_elo_shift`.
+    """
+    home_idx = np.asarray(home_idx)
+    away_idx = np.asarray(away_idx)
+    dest_idx = np.asarray(dest_idx)
+    neutral = dest_idx >= 0
+    dest = np.where(neutral, dest_idx, 0)
+    neutral_shift = -(travel_table["travel_shift"][home_idx, dest] +
+                      travel_table["travel_shift"][away_idx, dest])
+    return np.where(neutral, neutral_shift, travel_table["home_shift"][home_idx, away_idx])
 
 def win_prob(elo_diff):
-    "Calculates win probability with respect to the home team"
+    "Calculates win probability with respect to the home team. Works on scalars or arrays."
     win_probability = 1/(10**(-elo_diff/400)+1)
     return win_probability
 
-def postgame_elo_shift(game_dict, cur):
+def postgame_elo_shift(game_dict, cur, k=K_FACTOR, mov_constant=MOV_CONSTANT,
+                       mov_elo_scale=MOV_ELO_SCALE):
     """
     Calculates the points to be added or subtracted to the home team
     based on the game results. The opposite must be done to the away team.
@@ -113,6 +200,10 @@ def postgame_elo_shift(game_dict, cur):
             "home_pregame_elo": home pregame elo score,
             "away_pregame_elo": away pregame elo score,
         }
+    k : float
+        K-factor.
+    mov_constant, mov_elo_scale : float
+        Constants of the margin of victory multiplier.
 
     Returns:
     --------
@@ -123,9 +214,6 @@ def postgame_elo_shift(game_dict, cur):
     """
     home_points = int(game_dict["home_points"])
     away_points = int(game_dict["away_points"])
-
-    # recommended K-factor
-    K = 20 
     
     # elo_diff = elo_team_adjustment(game_dict, cur) # calcs wrt home team
     if game_dict["playoffs"]:
@@ -153,11 +241,128 @@ def postgame_elo_shift(game_dict, cur):
     else:
         if point_diff < 0:
             elo_diff *= -1
-        mov = np.log(abs(point_diff)+1)*(2.2/(elo_diff*0.001+2.2))
+        mov = np.log(abs(point_diff)+1)*(mov_constant/(elo_diff*mov_elo_scale+mov_constant))
+
+    return round(k*forecast_delta*mov)
+
+def mov_multiplier_batch(elo_diff, point_diff, mov_constant=MOV_CONSTANT,
+                         mov_elo_scale=MOV_ELO_SCALE):
+    """
+    Margin of victory multiplier for many games at once.
+
+    Parameters:
+    -----------
+    elo_diff : np.ndarray
+        Home minus away pregame elo of each game, already scaled for playoffs.
+    point_diff : np.ndarray
+        Home minus away points of each game.
+    mov_constant, mov_elo_scale : float
+        Constants of the margin of victory multiplier.
+
+    Returns:
+    --------
+    np.ndarray
+        MOV multiplier of each game. Ties get the same fixed value 
+        as `postgame_elo_shift`.
+    """
+    elo_diff = np.asarray(elo_diff, dtype=np.float64)
+    point_diff = np.asarray(point_diff)
+
+    # elo difference with respect to the winner
+    winner_elo_diff = np.where(point_diff < 0, -elo_diff, elo_diff)
+    mov = np.log(np.abs(point_diff)+1)*(mov_constant/(winner_elo_diff*mov_elo_scale+mov_constant))
+    return np.where(point_diff == 0, 1.525, mov)
+
+def postgame_elo_shift_batch(home_pregame_elo, away_pregame_elo, home_points, 
+                             away_points, playoffs, k=K_FACTOR, mov_constant=MOV_CONSTANT,
+                             mov_elo_scale=MOV_ELO_SCALE):
+    """
+    Vectorized `postgame_elo_shift` for many games at once.
+
+    Parameters:
+    -----------
+    home_pregame_elo : np.ndarray
+        Home pregame elo score of each game.
+    away_pregame_elo : np.ndarray
+        Away pregame elo score of each game.
+    home_points : np.ndarray
+        Home team points of each game.
+    away_points : np.ndarray
+        Away team points of each game.
+    playoffs : np.ndarray
+        True for each playoff game.
+    k : float
+        K-factor.
+    mov_constant, mov_elo_scale : float
+        Constants of the margin of victory multiplier.
+
+    Returns:
+    --------
+    np.ndarray
+        The number of Elo points to be shifted from the away team to the
+        home team in each game, rounded the same way as `postgame_elo_shift`.
+    """
+    home_points = np.asarray(home_points, dtype=np.int64)
+    away_points = np.asarray(away_points, dtype=np.int64)
+
+    elo_diff = (np.asarray(home_pregame_elo, dtype=np.float64) - 
+                np.asarray(away_pregame_elo, dtype=np.float64))
+    elo_diff = np.where(np.asarray(playoffs, dtype=bool), elo_diff*1.2, elo_diff)
+
+    # forecast delta
+    point_diff = home_points - away_points
+    result = np.where(point_diff > 0, 1.0, np.where(point_diff < 0, 0.0, 0.5))
+    forecast_delta = result - win_prob(elo_diff)
+
+    mov = mov_multiplier_batch(elo_diff, point_diff, mov_constant, mov_elo_scale)
 
-    return round(K*forecast_delta*mov)
+    return np.round(k*forecast_delta*mov)
 
-def pre_season_elo(elo):
+def play_week(elo, home_idx, away_idx, pregame_shift, home_points, away_points, playoffs,
+              k=K_FACTOR, mov_constant=MOV_CONSTANT, mov_elo_scale=MOV_ELO_SCALE):
+    """
+    Play every game of a week in one vectorized step. Within a week each
+    team plays at most once, so every game only depends on the ratings at
+    the start of the week and the result is the same as playing the games
+    one at a time.
+
+    Parameters:
+    -----------
+    elo : np.ndarray
+        Rating of each team at the start of the week. Updated in place.
+    home_idx, away_idx : np.ndarray
+        Index into `elo` of the home and away team of each game.
+    pregame_shift : np.ndarray
+        Pregame elo shift to the home team of each game.
+    home_points, away_points, playoffs : np.ndarray
+        Result of each game, see `postgame_elo_shift_batch`.
+    k, mov_constant, mov_elo_scale : float
+        See `postgame_elo_shift_batch`.
+
+    Returns:
+    --------
+    home_pregame_elo : np.ndarray
+        Home team pregame elo of each game.
+    away_pregame_elo : np.ndarray
+        Away team pregame elo of each game.
+    elo_shift : np.ndarray
+        Postgame elo shifted from the away team to the home team in each game.
+    """
+    home_idx = np.asarray(home_idx)
+    away_idx = np.asarray(away_idx)
+    teams = np.concatenate((home_idx, away_idx))
+    if len(np.unique(teams)) != len(teams):
+        raise ValueError("a team can only play once in a week")
+
+    home_pregame_elo = elo[home_idx] + pregame_shift
+    away_pregame_elo = elo[away_idx] - pregame_shift
+    elo_shift = postgame_elo_shift_batch(home_pregame_elo, away_pregame_elo, home_points,
+                                         away_points, playoffs, k, mov_constant, mov_elo_scale)
+    elo[home_idx] = home_pregame_elo + elo_shift
+    elo[away_idx] = away_pregame_elo - elo_shift
+    return home_pregame_elo, away_pregame_elo, elo_shift
+
+def pre_season_elo(elo, mean=MEAN_ELO, regression=REGRESSION_TO_MEAN):
     """
     Calculate team's pre-season elo rating. It is essentially
     just a regression to the mean.
@@ -166,12 +371,36 @@ def pre_season_elo(elo):
     -----------
     elo : int
         Elo of a team at the end of a season.
+    mean : float
+        Elo that teams regress towards.
+    regression : float
+        Fraction of the distance to `mean` that is removed.
 
     Returns:
     --------
     int
         New elo value for the team.
     """
-    mean = 1505
-    new_elo = elo - (elo - mean)/3
-    return round(new_elo)        
\ No newline at end of file
+    new_elo = elo - (elo - mean)*regression
+    return round(new_elo)
+
+def pre_season_elo_batch(elo, mean=MEAN_ELO, regression=REGRESSION_TO_MEAN):
+    """
+    Vectorized `pre_season_elo` for an array of team elo ratings.
+
+    Parameters:
+    -----------
+    elo : np.ndarray
+        Elo of each team at the end of a season.
+    mean : float
+        Elo that teams regress towards.
+    regression : float
+        Fraction of the distance to `mean` that is removed.
+
+    Returns:
+    --------
+    np.ndarray
+        New elo value for each team.
+    """
+    elo = np.asarray(elo, dtype=np.float64)
+    return np.round(elo - (elo - mean)*regression)        
\ No newline at end of file
@@ -1,76 +1,418 @@
 """
 This script simulates previous seasons by calculating the Elo score for every game
-that has been played since 2010. Stores the resulting pregame elo 
+that has been played since 2010. Stores the resulting pregame elo
 prediction in the Games table in the database.
+
+The whole history is loaded into NumPy arrays once and replayed in memory,
+so the database is only touched to read the games and to write the results.
 """
 
 import sqlite3
-from elo_model import postgame_elo_shift, pre_season_elo, pregame_elo_shift
+import numpy as np
+import game_cache
+import migrations
+import registry
+from elo_model import (play_week, postgame_elo_shift, postgame_elo_shift_batch,
+                       pre_season_elo_batch, pregame_elo_shift_batch)
+
+INITIAL_ELO = 1505
+PLAYOFF_WEEKS = ["WildCard", "Division", "ConfChamp", "SuperBowl"]
+
+def season_weeks(length):
+    """
+    Names of the weeks in a season in the order they are played.
+
+    Parameters
+    ----------
+    length : int
+        Number of regular season weeks.
+
+    Returns
+    -------
+    list[str]
+        e.g. ["1", ..., "17", "WildCard", "Division", "ConfChamp", "SuperBowl"]
+    """
+    return [str(week) for week in range(1, length+1)] + PLAYOFF_WEEKS
+
+def load_history(cur):
+    """
+    Load every game in the database into arrays sorted in replay order
+    (season, then week, then game id). The games are read from the
+    columnar cache in game_cache.
+
+    Teams are referred to by their position in ``team_ids`` rather than
+    by name so that ratings can be kept in a single array.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    dict[str: np.ndarray]
+        {"team_ids": Teams.id of each team index,
+         "game_id", "season_id", "week_id": ids of each game,
+         "season_idx": position of the game's season in replay order,
+         "home_idx", "away_idx": team index of the home and away team,
+         "dest_idx": team index of the neutral site host, -1 for home games,
+         "home_points", "away_points", "playoffs",
+         "pregame_shift": pregame elo shift to the home team (see
+                          elo_model.pregame_elo_shift)}
+    """
+    lookups = registry.get(cur)
+    week_names = lookups["week_names"]
+    seasons = [(season_id, lookups["season_lengths"][season_id])
+               for _, season_id in sorted(lookups["season_ids"].items())]
+    games = game_cache.load(cur, ["game_id", "season_id", "week_id", "home_team_id",
+                                  "away_team_id", "home_points", "away_points",
+                                  "playoffs", "neutral_site_id"])
+
+    travel_table = lookups["travel_table"]
+    # the travel table orders teams by id as well
+    team_ids = np.array(list(lookups["team_names"]), dtype=np.int64)
+    season_idx = {season_id: idx for idx, (season_id, _) in enumerate(seasons)}
+    week_order = {season_id: {week: idx for idx, week in enumerate(season_weeks(length))}
+                  for season_id, length in seasons}
+
+    # position of each (season, week) in its season's schedule, -1 for
+    # weeks that are not part of the schedule, which are never replayed
+    season_week = np.stack((games["season_id"], games["week_id"]), axis=1)
+    keys, key_idx = np.unique(season_week, axis=0, return_inverse=True)
+    key_week_idx = np.array([week_order[season_id].get(week_names[week_id], -1)
+                             for season_id, week_id in keys.tolist()], dtype=np.int64)
+    week_idx = key_week_idx[key_idx.reshape(-1)]
+    scheduled = week_idx >= 0
+
+    # Teams.id to team index, the spare last slot maps the -1 neutral_site_id
+    # of home games to -1
+    team_idx = np.full(team_ids.max(initial=0) + 2, -1, dtype=np.int64)
+    team_idx[team_ids] = np.arange(len(team_ids))
+    season_positions = np.full(max(season_idx, default=0) + 1, -1, dtype=np.int64)
+    season_positions[list(season_idx)] = list(season_idx.values())
+
+    history = {
+        "team_ids": team_ids,
+        "game_id": np.array(games["game_id"][scheduled]),
+        "season_id": np.array(games["season_id"][scheduled]),
+        "week_id": np.array(games["week_id"][scheduled]),
+        "season_idx": season_positions[games["season_id"][scheduled]],
+        "week_idx": week_idx[scheduled],
+        "home_idx": team_idx[games["home_team_id"][scheduled]],
+        "away_idx": team_idx[games["away_team_id"][scheduled]],
+        "home_points": np.array(games["home_points"][scheduled]),
+        "away_points": np.array(games["away_points"][scheduled]),
+        "playoffs": np.array(games["playoffs"][scheduled]),
+        "dest_idx": team_idx[games["neutral_site_id"][scheduled]],
+    }
+    # the travel shift does not depend on elo so it is computed for every game up front
+    history["pregame_shift"] = pregame_elo_shift_batch(history["home_idx"], history["away_idx"],
+                                                       history["dest_idx"], travel_table)
+
+    order = np.lexsort((history["game_id"], history["week_idx"], history["season_idx"]))
+    for key, values in history.items():
+        if key != "team_ids":
+            history[key] = values[order]
+
+    return history
+
+def week_starts(history):
+    """
+    Index of the first game of every (season, week) in `history`.
+
+    Parameters
+    ----------
+    history : dict[str: np.ndarray]
+        Game arrays from `load_history`.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted indexes into the game arrays.
+    """
+    season_idx = history["season_idx"]
+    week_idx = history["week_idx"]
+    new_week = np.ones(len(season_idx), dtype=bool)
+    new_week[1:] = (season_idx[1:] != season_idx[:-1]) | (week_idx[1:] != week_idx[:-1])
+    return np.flatnonzero(new_week)
+
+def replay(history, elo=None, start=0, params=None, carry_over=False, by_week=True):
+    """
+    Replay the games in `history` without touching the database.
+
+    Every team starts at INITIAL_ELO. At the start of each season the
+    ratings are set to the pre-season regression of the ratings the replay
+    started with (not the previous season's final ratings), which is how
+    the pregame elo values have always been generated.
+
+    Parameters
+    ----------
+    history : dict[str: np.ndarray]
+        Game arrays from `load_history`.
+    elo : np.ndarray
+        Ratings of each team before game `start`, e.g. from a checkpoint.
+        Default is None which starts every team at INITIAL_ELO.
+    start : int
+        Index of the first game to replay. Must be the first game of a week
+        when `elo` is given.
+    params : dict[str: float]
+        Overrides for the elo_model constants, any of "k", "mov_constant",
+        "mov_elo_scale", "mean" and "regression". The travel constants are
+        already baked into history["pregame_shift"]. Default is None.
+    carry_over : bool
+        If True each season regresses from the previous season's final
+        ratings instead of the ratings the replay started with.
+    by_week : bool
+        If True all games of a week are played in one vectorized step with
+        elo_model.play_week. Weeks where a team plays more than once, and 
+        every week when False, are played one game at a time.
+
+    Returns
+    -------
+    home_pregame_elo : np.ndarray
+        Home team pregame elo of each replayed game.
+    away_pregame_elo : np.ndarray
+        Away team pregame elo of each replayed game.
+    elo : np.ndarray
+        Rating of each team after the last game.
+    checkpoints : list[tuple[int, np.ndarray]]
+        (game index, team ratings) before the first game of every
+        replayed week.
+    """
+    params = params or {}
+    postgame_params = {key: params[key] for key in ("k", "mov_constant", "mov_elo_scale")
+                       if key in params}
+    season_params = {key: params[key] for key in ("mean", "regression") if key in params}
+
+    start_elo = np.full(len(history["team_ids"]), INITIAL_ELO, dtype=np.float64)
+    season_start_elo = pre_season_elo_batch(start_elo, **season_params)
+    if elo is None:
+        elo = start_elo.copy()
+        resumed = False
+    else:
+        elo = np.asarray(elo, dtype=np.float64).copy()
+        resumed = True
+
+    n_games = len(history["game_id"]) - start
+    home_pregame_elo = np.zeros(n_games)
+    away_pregame_elo = np.zeros(n_games)
+    checkpoints = []
+
+    season_idx = history["season_idx"]
+    home_idx = history["home_idx"]
+    away_idx = history["away_idx"]
+    starts = week_starts(history)
+    starts = np.union1d([start], starts[starts > start]) if n_games else starts[:0]
+    ends = np.append(starts[1:], start + n_games)
+    for week_start, week_end in zip(starts.tolist(), ends.tolist()):
+        new_season = week_start == 0 or season_idx[week_start] != season_idx[week_start-1]
+        # a checkpoint already holds the ratings after any pre-season regression
+        if new_season and not (resumed and week_start == start):
+            if carry_over:
+                elo = pre_season_elo_batch(elo, **season_params)
+            else:
+                elo = season_start_elo.copy()
+        checkpoints.append((week_start, elo.copy()))
+
+        games = slice(week_start, week_end)
+        replayed = slice(week_start - start, week_end - start)
+        teams = np.concatenate((home_idx[games], away_idx[games]))
+        if by_week and len(np.unique(teams)) == len(teams):
+            home_pregame_elo[replayed], away_pregame_elo[replayed], _ = play_week(
+                elo, home_idx[games], away_idx[games], history["pregame_shift"][games],
+                history["home_points"][games], history["away_points"][games],
+                history["playoffs"][games], **postgame_params)
+            continue
+
+        for idx in range(week_start, week_end):
+            home, away = home_idx[idx], away_idx[idx]
+            shift = history["pregame_shift"][idx]
+            game_dict = {
+                "home_points": history["home_points"][idx],
+                "away_points": history["away_points"][idx],
+                "playoffs": history["playoffs"][idx],
+                "home_pregame_elo": elo[home] + shift,
+                "away_pregame_elo": elo[away] - shift,
+            }
+            post_elo_shift = postgame_elo_shift(game_dict, None, **postgame_params)
+
+            home_pregame_elo[idx - start] = game_dict["home_pregame_elo"]
+            away_pregame_elo[idx - start] = game_dict["away_pregame_elo"]
+            elo[home] = game_dict["home_pregame_elo"] + post_elo_shift
+            elo[away] = game_dict["away_pregame_elo"] - post_elo_shift
+
+    return home_pregame_elo, away_pregame_elo, elo, checkpoints
+
+def save_checkpoints(cur, history, checkpoints):
+    """
+    Store team ratings at week boundaries in the EloCheckpoints table.
+    The ratings of all teams are packed into one little-endian int32 
+    BLOB per boundary, ordered by Teams.id.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    history : dict[str: np.ndarray]
+        Game arrays from `load_history`.
+    checkpoints : list[tuple[int, np.ndarray]]
+        Checkpoints returned by `replay`.
+    """
+    cur.executemany("""INSERT OR REPLACE INTO EloCheckpoints (season_id, week_id, elo)
+                    VALUES (?, ?, ?)""",
+                    [(int(history["season_id"][idx]), int(history["week_id"][idx]),
+                      np.asarray(elo, dtype="<i4").tobytes())
+                     for idx, elo in checkpoints])
+
+def load_checkpoint(cur, history, before):
+    """
+    Find the latest checkpoint at or before game `before`.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    history : dict[str: np.ndarray]
+        Game arrays from `load_history`.
+    before : int
+        Index of the earliest game that has to be replayed.
+
+    Returns
+    -------
+    tuple[int, np.ndarray] or None
+        (index of the first game after the checkpoint, team ratings),
+        None if there is no usable checkpoint.
+    """
+    stored = {(season_id, week_id): elo for season_id, week_id, elo in
+              cur.execute("SELECT season_id, week_id, elo FROM EloCheckpoints")}
+    n_teams = len(history["team_ids"])
+    for idx in week_starts(history)[::-1]:
+        if idx > before:
+            continue
+        key = (int(history["season_id"][idx]), int(history["week_id"][idx]))
+        if key in stored and len(stored[key]) == n_teams*4:
+            return int(idx), np.frombuffer(stored[key], dtype="<i4").astype(np.float64)
+    return None
+
+def save_elo_history(cur, history, start, home_pregame_elo, away_pregame_elo):
+    """
+    Store the rating of both teams before and after each replayed game in
+    the EloHistory table, one row per team per game.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    history : dict[str: np.ndarray]
+        Game arrays from `load_history`.
+    start : int
+        Index of the first replayed game.
+    home_pregame_elo, away_pregame_elo : np.ndarray
+        Pregame elo of the replayed games returned by `replay`.
+    """
+    games = slice(start, None)
+    elo_shift = postgame_elo_shift_batch(home_pregame_elo, away_pregame_elo,
+                                         history["home_points"][games],
+                                         history["away_points"][games],
+                                         history["playoffs"][games])
+    season_id = history["season_id"][games].tolist()
+    week_id = history["week_id"][games].tolist()
+    home_team_id = history["team_ids"][history["home_idx"][games]].tolist()
+    away_team_id = history["team_ids"][history["away_idx"][games]].tolist()
+
+    rows = list(zip(home_team_id, season_id, week_id, home_pregame_elo.astype(int).tolist(),
+                    (home_pregame_elo + elo_shift).astype(int).tolist()))
+    rows += zip(away_team_id, season_id, week_id, away_pregame_elo.astype(int).tolist(),
+                (away_pregame_elo - elo_shift).astype(int).tolist())
+    cur.executemany("""INSERT OR REPLACE INTO EloHistory (team_id, season_id, week_id, pre, post)
+                    VALUES (?, ?, ?, ?, ?)""", rows)
+
+def write_results(cur, history, start, home_pregame_elo, away_pregame_elo, elo, checkpoints):
+    """
+    Write the output of `replay` back to the Games, Teams, EloHistory
+    and EloCheckpoints tables.
+    """
+    cur.executemany("UPDATE Games SET home_pregame_elo = ?, away_pregame_elo = ? WHERE id = ?",
+                    zip(home_pregame_elo.astype(int).tolist(),
+                        away_pregame_elo.astype(int).tolist(),
+                        history["game_id"][start:].tolist()))
+    cur.executemany("UPDATE Teams SET elo = ? WHERE id = ?",
+                    zip(elo.astype(int).tolist(), history["team_ids"].tolist()))
+    save_elo_history(cur, history, start, home_pregame_elo, away_pregame_elo)
+    save_checkpoints(cur, history, checkpoints)
 
 def run():
 
     conn = sqlite3.connect('db.sqlite')
     cur = conn.cursor()
 
-    cur.execute("UPDATE Teams SET elo=1505")
+    migrations.migrate(conn)
+    migrations.clear_tables(cur, ["EloCheckpoints", "EloHistory"])
+
+    history = load_history(cur)
+    home_pregame_elo, away_pregame_elo, elo, checkpoints = replay(history)
+    write_results(cur, history, 0, home_pregame_elo, away_pregame_elo, elo, checkpoints)
+
     conn.commit()
+    conn.close()
+
+def update_games(cur, game_ids, elo=None):
+    """
+    Recompute the Elo history after the games in `game_ids` were added or changed.
+
+    Restarts from the nearest checkpoint before the earliest of those games
+    and only rewrites the pregame elo of the games from that point on. Replays
+    the whole history if there are no checkpoints yet.
+    NOTE: Commit must be made after the function returns.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    game_ids : iter[int]
+        Ids of the games in the Games table that were added or changed.
+    elo : np.ndarray
+        Rating of each team, ordered by Teams.id, before the week of the
+        earliest of the games, which must be its first game. It is stored as
+        that week's checkpoint and the replay starts from it instead of an
+        earlier checkpoint. Default is None.
+    """
+    history = load_history(cur)
+    changed = np.flatnonzero(np.isin(history["game_id"], list(game_ids)))
+    if len(changed) == 0:
+        return
+
+    if elo is not None:
+        start = int(changed[0])
+        if start not in week_starts(history):
+            raise ValueError("the ratings must be from before the first game of a week")
+    else:
+        checkpoint = load_checkpoint(cur, history, changed[0])
+        if checkpoint is None:
+            start, elo = 0, None
+        else:
+            start, elo = checkpoint
+
+    home_pregame_elo, away_pregame_elo, elo, checkpoints = replay(history, elo, start)
+    write_results(cur, history, start, home_pregame_elo, away_pregame_elo, elo, checkpoints)
 
-    seasons = cur.execute("SELECT season FROM Seasons").fetchall()
-    teams = cur.execute("SELECT * FROM Teams").fetchall()
-    weeks = cur.execute("SELECT week FROM Weeks").fetchall()
-
-    for idx, season in enumerate(seasons):
-        season = season[0]
-
-        for team in teams:
-            elo = pre_season_elo(team[5])
-            cur.execute("UPDATE Teams SET elo = ? WHERE id = ?",
-                        ( elo, team[0] ))
-        conn.commit()
-
-        season_len = cur.execute("SELECT length FROM Seasons WHERE season = ? ", ( season, )).fetchone()[0]
-        weeks = list(range(1,season_len+1)) + ["WildCard", "Division", "ConfChamp", "SuperBowl"]
-
-        for week in weeks:
-            games = cur.execute("""SELECT Games.home_team, Games.away_team,
-                                Games.home_points, Games.away_points, Games.playoffs,
-                                Games.neutral_destination, Games.id
-                                FROM Games JOIN Weeks JOIN Seasons 
-                                on Games.week_id = Weeks.id and Games.season_id = Seasons.id 
-                                WHERE Weeks.week = ? and Seasons.season = ? """,
-                                ( week, season) ).fetchall()
-            
-            for game in games:
-                game_dict = {
-                    "home_team": game[0],
-                    "away_team": game[1],
-                    "home_points": game[2],
-                    "away_points": game[3],
-                    "playoffs": game[4],
-                    "neutral_dest": game[5],
-                    "game_id": game[6]
-                }
-                pre_elo_shift = pregame_elo_shift(game_dict, cur)
-
-                home_team_elo = cur.execute("SELECT elo FROM Teams WHERE name = ?", (game_dict["home_team"],)).fetchone()[0]
-                away_team_elo = cur.execute("SELECT elo FROM Teams WHERE name = ?", (game_dict["away_team"],)).fetchone()[0]
-                
-                game_dict["home_pregame_elo"] = home_team_elo + pre_elo_shift
-                game_dict["away_pregame_elo"] = away_team_elo - pre_elo_shift
-
-                post_elo_shift = postgame_elo_shift(game_dict, cur)            
-                cur.execute("UPDATE Games SET home_pregame_elo = ? WHERE id = ?", 
-                            (game_dict["home_pregame_elo"], game_dict["game_id"]))
-                cur.execute("UPDATE Games SET away_pregame_elo = ? WHERE id = ?", 
-                            (game_dict["away_pregame_elo"], game_dict["game_id"]))
-
-                away_team_elo = game_dict["away_pregame_elo"] - post_elo_shift
-                home_team_elo = game_dict["home_pregame_elo"] + post_elo_shift
-                cur.execute("UPDATE Teams SET elo = ? WHERE name = ?", (home_team_elo, game_dict["home_team"]))
-                cur.execute("UPDATE Teams SET elo = ? WHERE name = ?", (away_team_elo, game_dict["away_team"]))
-
-            conn.commit()
+def update(game_ids):
+    """
+    Recompute the Elo history after the games in `game_ids` were added or
+    changed, see `update_games`.
+
+    Parameters
+    ----------
+    game_ids : iter[int]
+        Ids of the games in the Games table that were added or changed.
+    """
+    conn = sqlite3.connect('db.sqlite')
+    cur = conn.cursor()
+
+    migrations.migrate(conn)
+    update_games(cur, game_ids)
+
+    conn.commit()
     conn.close()
 
 if __name__ == '__main__':
-    run()
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1:
+        update([int(game_id) for game_id in sys.argv[1:]])
+    else:
+        run()
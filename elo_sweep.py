@@ -0,0 +1,187 @@
+"""
+This script searches for better Elo model constants by replaying the
+game history with every combination of values in a parameter grid and
+scoring the pregame predictions of each one.
+
+The history is read from the database once and handed to a pool of
+worker processes, which replay configurations in memory with elo_sim.replay.
+"""
+
+import argparse
+import itertools
+import os
+import sqlite3
+import time
+import numpy as np
+import elo_model
+import elo_sim
+
+DEFAULT_GRID = {
+    "k": [15, 20, 25, 30],
+    "home_field_advantage": [32, 48, 56, 65],
+    "regression": [1/4, 1/3, 1/2],
+    "travel_per_mile": [0, 0.002, 0.004, 0.006],
+    "mov_constant": [2.2],
+    "mov_elo_scale": [0.001],
+}
+
+# read-only game history of a worker process, set by `init_worker`
+_HISTORY = None
+_DISTANCE = None
+
+def load(cur):
+    """
+    Load the game history and the team-by-team distance matrix.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    history : dict[str: np.ndarray]
+        Game arrays from elo_sim.load_history.
+    distance : np.ndarray
+        (n_teams, n_teams) distances in miles from elo_model.build_travel_table.
+    """
+    history = elo_sim.load_history(cur)
+    distance = elo_model.build_travel_table(cur)["distance"]
+    return history, distance
+
+def init_worker(history, distance):
+    """
+    Store the shared history in a worker process and mark it read-only.
+    """
+    global _HISTORY, _DISTANCE
+    for values in history.values():
+        values.setflags(write=False)
+    distance.setflags(write=False)
+    _HISTORY = history
+    _DISTANCE = distance
+
+def param_grid(grid):
+    """
+    Expand a grid of parameter values into every combination.
+
+    Parameters
+    ----------
+    grid : dict[str: list]
+        Values to try for each parameter.
+
+    Returns
+    -------
+    list[dict[str: float]]
+        One dictionary of parameter values per configuration.
+    """
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+def evaluate(params, history=None, distance=None, carry_over=True, skip_seasons=1):
+    """
+    Replay the history with `params` and score the pregame predictions.
+
+    Parameters
+    ----------
+    params : dict[str: float]
+        Elo constants, any of "k", "home_field_advantage", "mean", "regression",
+        "travel_per_mile", "mov_constant" and "mov_elo_scale". Missing values
+        use the elo_model defaults.
+    history : dict[str: np.ndarray]
+        Game arrays from `load`. Defaults to the worker's shared history.
+    distance : np.ndarray
+        Distance matrix from `load`. Defaults to the worker's shared matrix.
+    carry_over : bool
+        Regress each season from the previous season's ratings, see
+        elo_sim.replay. Without it "regression" has no effect.
+    skip_seasons : int
+        Number of seasons at the start of the history used only to warm 
+        up the ratings and left out of the scores.
+
+    Returns
+    -------
+    dict[str: float]
+        `params` with the "spread_mae" (points) and "brier" scores added.
+    """
+    if history is None:
+        history, distance = _HISTORY, _DISTANCE
+
+    home_shift, travel_shift = elo_model.travel_shifts(
+        distance,
+        params.get("home_field_advantage", elo_model.HOME_FIELD_ADVANTAGE),
+        params.get("travel_per_mile", elo_model.TRAVEL_ELO_PER_MILE))
+    shifted = dict(history)
+    shifted["pregame_shift"] = elo_model.pregame_elo_shift_batch(
+        history["home_idx"], history["away_idx"], history["dest_idx"],
+        {"home_shift": home_shift, "travel_shift": travel_shift})
+
+    home_pregame_elo, away_pregame_elo, _, _ = elo_sim.replay(shifted, params=params,
+                                                              carry_over=carry_over)
+
+    scored = history["season_idx"] >= skip_seasons
+    home_pregame_elo = home_pregame_elo[scored]
+    away_pregame_elo = away_pregame_elo[scored]
+    point_diff = history["home_points"][scored] - history["away_points"][scored]
+
+    # spreads are with respect to the home team
+    pred_spread = (away_pregame_elo - home_pregame_elo)/25
+    spread_mae = np.mean(np.abs(pred_spread + point_diff))
+
+    elo_diff = home_pregame_elo - away_pregame_elo
+    elo_diff = np.where(history["playoffs"][scored], elo_diff*1.2, elo_diff)
+    result = np.where(point_diff > 0, 1.0, np.where(point_diff < 0, 0.0, 0.5))
+    brier = np.mean((elo_model.win_prob(elo_diff) - result)**2)
+
+    return {**params, "spread_mae": float(spread_mae), "brier": float(brier)}
+
+def sweep(grid, workers=None, carry_over=True):
+    """
+    Score every configuration in `grid` in parallel.
+
+    Parameters
+    ----------
+    grid : dict[str: list]
+        Values to try for each parameter.
+    workers : int
+        Number of worker processes. Default is None which uses every core.
+    carry_over : bool
+        See `evaluate`.
+
+    Returns
+    -------
+    list[dict[str: float]]
+        Results of `evaluate` sorted from lowest to highest spread MAE.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    conn = sqlite3.connect('db.sqlite')
+    history, distance = load(conn.cursor())
+    conn.close()
+
+    configs = param_grid(grid)
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(configs) // (workers*4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(history, distance)) as executor:
+        results = list(executor.map(partial(evaluate, carry_over=carry_over),
+                                    configs, chunksize=chunksize))
+
+    return sorted(results, key=lambda result: result["spread_mae"])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep the Elo model constants.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of configurations to print")
+    parser.add_argument("--no-carry-over", action="store_true",
+                        help="reset every season the way elo_sim.run does")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = sweep(DEFAULT_GRID, args.workers, not args.no_carry_over)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(results)} configurations in {elapsed:.1f}s")
+    for result in results[:args.top]:
+        print(", ".join(f"{name}={value:.4g}" for name, value in result.items()))
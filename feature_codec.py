@@ -0,0 +1,128 @@
+"""
+Storage format of the rolling game windows in the MLData, InferenceData
+and TeamAiData tables.
+
+Each row keeps the last `WINDOW` games of the home and the away team as a
+single BLOB of little-endian int16 values with shape (2, len(STATS), WINDOW),
+home side first and the oldest game first within a window. Reading a row
+is one np.frombuffer call instead of decoding over 200 integer columns.
+
+The windows are stored per row rather than once per game, as the rows
+do not all cut the same windows from a team's games.
+"""
+
+import numpy as np
+
+STATS = ("elo_for", "elo_against",
+         "points_for", "points_against",
+         "yards_for", "yards_against",
+         "turnovers_for", "turnovers_against")
+# the model features are "for" minus "against" of each pair in STATS
+FEATURES = ("elo_diff", "point_diff", "yard_diff", "turnover_diff")
+WINDOW = 14
+HOME = 0
+AWAY = 1
+
+DTYPE = np.dtype("<i2")
+SHAPE = (2, len(STATS), WINDOW)
+
+def pack(windows):
+    """
+    Pack the game windows of one row into a BLOB.
+
+    Parameters
+    ----------
+    windows : array_like
+        Integer stats with shape (2, len(STATS), WINDOW) or
+        (len(STATS), WINDOW) for a single side.
+
+    Returns
+    -------
+    bytes
+
+    Raises
+    ------
+    ValueError
+        If a value does not fit in an int16.
+    """
+    windows = np.asarray(windows)
+    info = np.iinfo(DTYPE)
+    if windows.size and (windows.min() < info.min or windows.max() > info.max):
+        raise ValueError("game stats do not fit in an int16")
+    return windows.astype(DTYPE).tobytes()
+
+def pack_many(windows):
+    """
+    Pack the game windows of many rows, one BLOB per row.
+
+    Parameters
+    ----------
+    windows : np.ndarray
+        Integer stats with shape (n_rows, *SHAPE).
+
+    Returns
+    -------
+    list[bytes]
+
+    Raises
+    ------
+    ValueError
+        If a value does not fit in an int16.
+    """
+    windows = np.asarray(windows)
+    info = np.iinfo(DTYPE)
+    if windows.size and (windows.min() < info.min or windows.max() > info.max):
+        raise ValueError("game stats do not fit in an int16")
+    packed = np.ascontiguousarray(windows, dtype=DTYPE)
+    return [row.tobytes() for row in packed]
+
+def unpack(blob):
+    """
+    Read the game windows of one row.
+
+    Parameters
+    ----------
+    blob : bytes
+        BLOB written by `pack`.
+
+    Returns
+    -------
+    np.ndarray
+        Read-only view of the BLOB with shape SHAPE.
+    """
+    return np.frombuffer(blob, dtype=DTYPE).reshape(SHAPE)
+
+def unpack_many(blobs):
+    """
+    Read the game windows of many rows into one array.
+
+    Parameters
+    ----------
+    blobs : list[bytes]
+        BLOBs written by `pack`.
+
+    Returns
+    -------
+    np.ndarray
+        Shape (len(blobs), *SHAPE).
+    """
+    return np.frombuffer(b"".join(blobs), dtype=DTYPE).reshape(-1, *SHAPE)
+
+def for_against_diffs(windows):
+    """
+    Difference between the mean "for" and "against" stats of each window.
+
+    Parameters
+    ----------
+    windows : np.ndarray
+        Game windows with stats on the second to last axis and games on
+        the last axis, e.g. from `unpack_many`.
+
+    Returns
+    -------
+    np.ndarray
+        The stats axis is replaced by the FEATURES axis, e.g. shape
+        (n_rows, 2, len(FEATURES)) for the output of `unpack_many`.
+    """
+    means = windows.mean(axis=-1)
+    return means[..., 0::2] - means[..., 1::2]
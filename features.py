@@ -0,0 +1,125 @@
+"""
+Builds the MLData, InferenceData and TeamAiData tables in one pass over
+the game history.
+
+The game history is read from game_cache and exploded into team-game
+rows once (see rolling_stats.lagged_windows), then fanned out to the
+training rows, which only see the games in weeks 1 to 15, and the
+inference rows, which see every game. The first season's games in weeks
+1 to 15 fill the windows of both.
+"""
+
+import sqlite3
+import numpy as np
+import feature_codec
+import game_cache
+import migrations
+import registry
+import rolling_stats
+
+TABLES = ["MLData", "InferenceData", "TeamAiData"]
+
+def team_ai_rows(games, inference, windows, lookups):
+    """
+    TeamAiData rows, the InferenceData row of each team's last game.
+
+    Parameters
+    ----------
+    games : dict[str: np.ndarray]
+        Game columns from game_cache.load.
+    inference : np.ndarray
+        Mask of the games in InferenceData.
+    windows : np.ndarray
+        Windows of the games in InferenceData from rolling_stats.lagged_windows.
+    lookups : dict
+        From registry.get.
+
+    Returns
+    -------
+    list[tuple]
+        (id, team_id, home_team, home_pregame_elo, away_pregame_elo,
+        week_number, windows) for every team in registry.TEAMS.
+    """
+    home_team = games["home_team_id"]
+    away_team = games["away_team_id"]
+    position = np.arange(len(home_team))
+    last_game = np.full(max(home_team.max(initial=0), away_team.max(initial=0)) + 1, -1)
+    np.maximum.at(last_game, home_team, position)
+    np.maximum.at(last_game, away_team, position)
+    # row of each game in `windows`
+    inference_row = np.cumsum(inference) - 1
+
+    rows = []
+    for table_id, team in enumerate(registry.TEAMS, start=1):
+        team_id = lookups["team_ids"][team]
+        game = last_game[team_id]
+        rows.append((table_id, team_id, int(home_team[game] == team_id),
+                     int(games["home_pregame_elo"][game]), int(games["away_pregame_elo"][game]),
+                     lookups["week_names"][int(games["week_id"][game])],
+                     feature_codec.pack(windows[inference_row[game]])))
+    return rows
+
+def build(cur, tables=TABLES):
+    """
+    Refill feature tables from the game history.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    tables : list[str]
+        Any of TABLES. Default is all of them.
+    """
+    lookups = registry.get(cur)
+    games = game_cache.load(cur)
+
+    # week ids below 16 are weeks 1 to 15, see init_db
+    early_weeks = games["week_id"] < 16
+    first_season = games["season_id"] == 1
+    selections = {
+        "MLData": early_weeks & ~first_season,
+        "InferenceData": ~first_season,
+    }
+    # TeamAiData is cut from the InferenceData windows
+    needed = [table for table in selections
+              if table in tables or (table == "InferenceData" and "TeamAiData" in tables)]
+    windows = dict(zip(needed, rolling_stats.lagged_windows(
+        games, early_weeks & first_season, [selections[table] for table in needed])))
+
+    week_names = [lookups["week_names"][week_id] for week_id in games["week_id"].tolist()]
+    for table in needed:
+        if table not in tables:
+            continue
+        selected = selections[table]
+        migrations.clear_tables(cur, [table])
+        cur.executemany(f"""INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?)""",
+                        zip(range(1, len(windows[table]) + 1),
+                            games["game_id"][selected].tolist(),
+                            games["home_pregame_elo"][selected].astype(np.int64).tolist(),
+                            games["away_pregame_elo"][selected].astype(np.int64).tolist(),
+                            [week_names[idx] for idx in np.flatnonzero(selected).tolist()],
+                            feature_codec.pack_many(windows[table])))
+
+    if "TeamAiData" in tables:
+        migrations.clear_tables(cur, ["TeamAiData"])
+        cur.executemany("""INSERT INTO TeamAiData VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        team_ai_rows(games, selections["InferenceData"],
+                                     windows["InferenceData"], lookups))
+
+def run(tables=TABLES):
+    """
+    Refill feature tables in the database.
+
+    Parameters
+    ----------
+    tables : list[str]
+        Any of TABLES. Default is all of them.
+    """
+    conn = sqlite3.connect('db.sqlite')
+    cur = conn.cursor()
+    migrations.migrate(conn)
+    build(cur, tables)
+    conn.commit()
+    conn.close()
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,200 @@
+"""
+Columnar cache of the Games table.
+
+Every column in COLUMNS is written to its own .npy file in CACHE_DIR, next
+to a manifest naming the version of the Games table the files were
+exported from. `load` memory-maps the files read-only, so reading the game
+history is a few page faults instead of a query decoded into tuples, and
+processes that open the same files share the pages.
+
+Triggers keep a version counter of the Games table in the TableVersions
+table (see migrations), so any insert, update or delete of a game makes
+the cache stale and the next `load` exports it again. Only committed games
+are exported: a transaction that is rolled back takes its version back
+with it, and a later change would reuse that version for other games.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+
+CACHE_DIR = 'game_cache'
+MANIFEST = 'manifest.json'
+
+# name: (SQL expression selected from Games, dtype)
+COLUMNS = {
+    "game_id": ("Games.id", "<i8"),
+    "season_id": ("Games.season_id", "<i8"),
+    "week_id": ("Games.week_id", "<i8"),
+    "home_team_id": ("Games.home_team_id", "<i8"),
+    "away_team_id": ("Games.away_team_id", "<i8"),
+    "home_points": ("Games.home_points", "<i8"),
+    "away_points": ("Games.away_points", "<i8"),
+    "home_yards": ("Games.home_yards", "<i8"),
+    "away_yards": ("Games.away_yards", "<i8"),
+    "home_turnovers": ("Games.home_turnovers", "<i8"),
+    "away_turnovers": ("Games.away_turnovers", "<i8"),
+    "home_pregame_elo": ("Games.home_pregame_elo", "<f8"),
+    "away_pregame_elo": ("Games.away_pregame_elo", "<f8"),
+    "playoffs": ("Games.playoffs", "?"),
+    "neutral": ("Games.neutral_destination != 'None'", "?"),
+    # Teams.id of the team hosting a neutral site game, -1 for home games
+    "neutral_site_id": ("""COALESCE((SELECT id FROM Teams
+                        WHERE Teams.ticker = Games.neutral_destination), -1)""", "<i8"),
+}
+
+def games_version(cur):
+    """
+    Current version of the Games table.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    str
+        e.g. "3f9a0c1b2d4e5f60-7016". The first part changes when the
+        database is created from scratch, the second on every change to
+        a game.
+    """
+    generation, version = cur.execute(
+        "SELECT generation, version FROM TableVersions WHERE name = 'Games'").fetchone()
+    return f"{generation}-{version}"
+
+def read_manifest():
+    """
+    Manifest of the exported cache, None if there is none.
+    """
+    try:
+        with open(os.path.join(CACHE_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def database_path(cur):
+    """
+    Path of the database file `cur` reads.
+    """
+    return next(file for _, name, file in cur.execute("PRAGMA database_list") if name == "main")
+
+def read_columns(cur):
+    """
+    Read every column in COLUMNS from the Games table, ordered by Games.id.
+
+    Returns
+    -------
+    rows : int
+        Number of games.
+    columns : list[tuple]
+        Values of each column in COLUMNS.
+    """
+    rows = cur.execute(f"""SELECT {", ".join(sql for sql, _ in COLUMNS.values())}
+                       FROM Games ORDER BY Games.id""").fetchall()
+    return len(rows), list(zip(*rows)) or [()]*len(COLUMNS)
+
+def export(cur):
+    """
+    Write the committed Games table to the cache.
+
+    The games are read through a new connection to the database of `cur`,
+    in one read transaction with their version, so the changes `cur` has not
+    committed yet are never exported.
+
+    The files are written to a new directory that replaces the previous
+    export once complete, so processes that already mapped the old files
+    keep reading a consistent snapshot.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    dict
+        The manifest of the export.
+    """
+    conn = sqlite3.connect(database_path(cur))
+    try:
+        conn.execute("BEGIN")
+        version = games_version(conn.cursor())
+        n_games, columns = read_columns(conn.cursor())
+    finally:
+        conn.close()
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=CACHE_DIR, prefix=".export-")
+    for (name, (_, dtype)), values in zip(COLUMNS.items(), columns):
+        np.save(os.path.join(staging, name + ".npy"), np.array(values, dtype=dtype))
+
+    directory = "games-" + version
+    try:
+        os.replace(staging, os.path.join(CACHE_DIR, directory))
+    except OSError:
+        # another process exported the same version first
+        shutil.rmtree(staging)
+
+    manifest = {
+        "games_version": version,
+        "directory": directory,
+        "n_games": n_games,
+        "columns": {name: dtype for name, (_, dtype) in COLUMNS.items()},
+    }
+    manifest_path = os.path.join(CACHE_DIR, MANIFEST)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    # mapped files stay readable after they are unlinked
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith("games-") and entry != directory:
+            shutil.rmtree(os.path.join(CACHE_DIR, entry), ignore_errors=True)
+
+    return manifest
+
+def load(cur, columns=None):
+    """
+    Memory-map the game history, exporting it first if Games changed
+    since the last export.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    columns : list[str]
+        Names of the columns to load. Default is None which loads every
+        column in COLUMNS.
+
+    Returns
+    -------
+    dict[str: np.ndarray]
+        Read-only arrays with one value per game, ordered by Games.id.
+    """
+    version = games_version(cur)
+    dtypes = {name: dtype for name, (_, dtype) in COLUMNS.items()}
+    manifest = read_manifest()
+    if manifest is None or manifest["games_version"] != version or manifest["columns"] != dtypes:
+        manifest = export(cur)
+    if manifest["games_version"] != version:
+        # `cur` sees changes to Games that are not committed, which are read
+        # from the database instead of the cache
+        _, values = read_columns(cur)
+        return {name: np.array(values[list(COLUMNS).index(name)], dtype=dtypes[name])
+                for name in (columns or COLUMNS)}
+
+    directory = os.path.join(CACHE_DIR, manifest["directory"])
+    return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode='r')
+            for name in (columns or COLUMNS)}
+
+def run():
+    """
+    Export the game history if the cache is stale.
+    """
+    conn = sqlite3.connect('db.sqlite')
+    load(conn.cursor())
+    conn.close()
+
+if __name__ == '__main__':
+    run()
@@ -3,13 +3,10 @@ This program manages website startup and the API for requesting
 data.
 """
 import os
-import sqlite3
 import json
-import elo_sim
-import init_db
-import process_train_test_data
-import process_inference_data
-import upcoming_games
+import threading
+import db
+import queries
 from datetime import datetime, date
 from pytz import timezone
 from flask import Flask, send_from_directory
@@ -17,15 +14,15 @@ from flask_cors import CORS
 
 def setup():
     """
-    Run initialization scripts for the database so that
-    it is up to date with most recent games.
+    Bring the database schema up to date and rebuild the tables
+    whose inputs changed since they were last built (see pipeline).
 
-    Required to be run before the app is started!
+    Required to be run before the app is started! Tables that are
+    up to date are kept, including the weeks ingested this season.
     """
-    init_db.run()
-    elo_sim.run()
-    process_train_test_data.run()
-    process_inference_data.run()
+    # the batch modules are only imported by the processes that build tables
+    import pipeline
+    pipeline.run()
 
 
 app = Flask(__name__, static_folder='static')
@@ -36,11 +33,9 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 WEEK = 0
 SEASON = 2023
 UPCOMING_GAMES = None
-PRESEASON_ELO = True
 
-# connect to db
-conn = sqlite3.connect('db.sqlite', check_same_thread=False)
-cur = conn.cursor()
+# only one request at a time may ingest games and move the week forward
+INGEST_LOCK = threading.Lock()
 
 # routes
 @app.route('/', defaults={'path': ''})
@@ -78,6 +73,7 @@ def get_seasons():
     json
         list of lists of [year, length] of seasons.
     """
+    cur = db.reader().cursor()
     all_seasons = cur.execute("SELECT season, length FROM Seasons").fetchall()
     result = json.dumps(all_seasons)
 
@@ -103,11 +99,8 @@ def get_week_games(season, week):
         home_pregame_elo, away_pregame_elo, playoff_bool, home_bye_bool, 
         away_bye_bool, neutral_destination]
     """
-    games = cur.execute("""SELECT Games.*
-                        FROM Games JOIN Weeks JOIN Seasons
-                        on Games.week_id = Weeks.id and Games.season_id = Seasons.id
-                        WHERE Weeks.week = ? and Seasons.season = ? """,
-                        (week, season)).fetchall()
+    cur = db.reader().cursor()
+    games = cur.execute(queries.WEEK_GAMES, (week, season)).fetchall()
     result = json.dumps(games)
     return result
 
@@ -130,15 +123,8 @@ def get_ai_pred(season, week):
         "away_points": int, "elo_spread": float, "ai_spread": float}.
         "ai_spread" is with respect to the home team.
     """
-    games = cur.execute("""SELECT Games.home_team, Games.away_team,
-                        Games.home_points, Games.away_points, 
-                        AiInput.elo_pred_spread, AiInput.ai_spread
-                        FROM Games JOIN Weeks JOIN Seasons JOIN AiInput
-                        on Games.week_id = Weeks.id 
-                        and Games.season_id = Seasons.id 
-                        and Games.id = AiInput.game_id
-                        WHERE Weeks.week = ? and Seasons.season = ?""",
-                        (week, season)).fetchall()
+    cur = db.reader().cursor()
+    games = cur.execute(queries.AI_GAMES, (week, season)).fetchall()
     result = []
     for game in games:
         game_dict = {}
@@ -183,43 +169,99 @@ def serve_upcoming_games():
 
     """
     # TODO handle end of season condition and playoffs
+    import registry
+    import upcoming_games
     global UPCOMING_GAMES
     global WEEK
     global SEASON
-    global PRESEASON_ELO
 
-    if PRESEASON_ELO:
-        upcoming_games.add_season_to_db(cur, conn)
-        upcoming_games.update_pre_season_elo(cur, conn)
-        PRESEASON_ELO = False      
+    conn = db.writer()
+    cur = conn.cursor()
 
-    if WEEK == 0:
-        WEEK += 1
-        UPCOMING_GAMES = upcoming_games.update_week_games(cur,
-                                                          WEEK,
-                                                          SEASON, local_path='test_page.html')
+    with INGEST_LOCK:
+        week, upcoming = WEEK, UPCOMING_GAMES
 
-    now = datetime.now(timezone('EST'))
-    last_game_date = upcoming_games.calc_last_game_date(UPCOMING_GAMES)
+        # the ingest is one transaction, rolled back if it fails part way
+        try:
+            with conn:
+                # the database records how far the season got, so a restarted
+                # process picks up where the last one stopped
+                upcoming_games.start_season(cur, SEASON)
 
-    while now.date() > last_game_date:
-        upcoming_games.move_prev_week_to_db(cur, conn, WEEK, SEASON, local_path='test_page.html')
-        
-        WEEK += 1
-        UPCOMING_GAMES = upcoming_games.update_week_games(cur,
-                                                          WEEK,
-                                                          SEASON, local_path='test_page.html')
-        last_game_date = upcoming_games.calc_last_game_date(UPCOMING_GAMES)
+                if week == 0:
+                    week = upcoming_games.last_ingested_week(cur, SEASON) + 1
+                    upcoming = upcoming_games.update_week_games(cur,
+                                                                week,
+                                                                SEASON, local_path='test_page.html')
 
-    return json.dumps(UPCOMING_GAMES)
+                now = datetime.now(timezone('EST'))
+                last_game_date = upcoming_games.calc_last_game_date(upcoming)
+
+                while now.date() > last_game_date:
+                    upcoming_games.move_prev_week_to_db(cur, week, SEASON, local_path='test_page.html')
+
+                    week += 1
+                    upcoming = upcoming_games.update_week_games(cur,
+                                                                week,
+                                                                SEASON, local_path='test_page.html')
+                    last_game_date = upcoming_games.calc_last_game_date(upcoming)
+        except Exception:
+            # lookups read inside the transaction may name rows that no longer exist
+            registry.invalidate()
+            raise
+
+        # the week only moves forward once its games are committed
+        WEEK, UPCOMING_GAMES = week, upcoming
+
+    return json.dumps(upcoming)
+
+@app.route('/playoff-odds', methods=['GET'])
+def get_playoff_odds():
+    """
+    Get the simulated playoff odds of each team for the current week.
+
+    The season is simulated the first time a week is requested and 
+    the results are cached in the database after that.
+
+    Returns
+    -------
+    json
+        list of e.g. {"team": "Chicago Bears", "wins": 7.2, "division": 0.08,
+        "playoffs": 0.21, "seeds": [0.01, 0.02, 0.02, 0.03, 0.04, 0.04, 0.05]}
+    """
+    import season_sim
+    conn = db.writer()
+    odds = season_sim.get_odds(conn.cursor(), conn, max(WEEK, 1), SEASON, local_path='test_page.html')
+    return json.dumps(odds)
 
 @app.route('/team/<name>', methods=['GET'])
 def get_team(name):
-    team = cur.execute("""SELECT * FROM Teams WHERE name = ?""", (name, )).fetchall()
+    cur = db.reader().cursor()
+    team = cur.execute(queries.TEAM, (name, )).fetchall()
 
     return json.dumps(team)
 
+@app.route('/team/<name>/elo', methods=['GET'])
+def get_team_elo(name):
+    """
+    Get a team's Elo rating history.
+
+    Parameters
+    ----------
+    name : str
+        Team name (e.g. "Chicago Bears")
+
+    Returns
+    -------
+    json
+        list of [season, week, pregame_elo, postgame_elo] in the order
+        the games were played.
+    """
+    cur = db.reader().cursor()
+    history = cur.execute(queries.TEAM_ELO_HISTORY, (name,)).fetchall()
+    return json.dumps(history)
+
 if __name__ == '__main__':
     setup()
     app.run(debug=True)
-    conn.close()
\ No newline at end of file
+    db.close()
\ No newline at end of file
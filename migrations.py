@@ -0,0 +1,336 @@
+"""
+Versioned schema of the database.
+
+Every schema change is a migration function in MIGRATIONS. `migrate` applies
+the ones a database is missing, in order, each in its own transaction, and
+records them in the SchemaVersion table. Existing rows are kept, so a restart
+does not throw away the games ingested during the season.
+
+The migrations only use CREATE ... IF NOT EXISTS or check the current columns
+first, so they also bring a database built before SchemaVersion existed up
+to date.
+"""
+
+import sqlite3
+import numpy as np
+import feature_codec
+
+def table_columns(cur, table):
+    """
+    Names of the columns of `table`, empty if the table does not exist.
+    """
+    return [column[1] for column in cur.execute(f"PRAGMA table_info({table})")]
+
+def create_core_tables(cur):
+    """
+    Seasons, Weeks, Teams and Games.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS Seasons (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+        season TEXT UNIQUE,
+        length INTEGER
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS Weeks (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+        week TEXT UNIQUE
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS Teams (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+        ticker TEXT UNIQUE,
+        name TEXT UNIQUE,
+        latitude REAL,
+        longitude REAL,
+        elo INTEGER
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS Games (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+        season_id INTEGER,
+        week_id INTEGER,
+        home_team TEXT,
+        away_team TEXT,
+        home_points INTEGER,
+        away_points INTEGER,
+        home_yards INTEGER,
+        away_yards INTEGER,
+        home_turnovers INTEGER,
+        away_turnovers INTEGER,
+        home_pregame_elo INTEGER,
+        away_pregame_elo INTEGER,
+        playoffs INTEGER,
+        home_bye INTEGER,
+        away_bye INTEGER,
+        neutral_destination TEXT
+    )""")
+
+def add_team_ids(cur):
+    """
+    Key Games by team id and index the game lookups.
+
+    The id columns are appended because the frontend reads Games rows
+    by position.
+    """
+    columns = table_columns(cur, "Games")
+    for side in ("home", "away"):
+        if f"{side}_team_id" not in columns:
+            cur.execute(f"ALTER TABLE Games ADD COLUMN {side}_team_id INTEGER REFERENCES Teams (id)")
+            cur.execute(f"""UPDATE Games SET {side}_team_id =
+                        (SELECT id FROM Teams WHERE Teams.name = Games.{side}_team)""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_games_season_week ON Games (season_id, week_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_games_home_team ON Games (home_team_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_games_away_team ON Games (away_team_id)")
+
+def create_elo_tables(cur):
+    """
+    EloCheckpoints and EloHistory, written by elo_sim.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS EloCheckpoints (
+        season_id INTEGER,
+        week_id INTEGER,
+        elo BLOB,
+        PRIMARY KEY (season_id, week_id)
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS EloHistory (
+        team_id INTEGER,
+        season_id INTEGER,
+        week_id INTEGER,
+        pre INTEGER,
+        post INTEGER,
+        PRIMARY KEY (team_id, season_id, week_id)
+    ) WITHOUT ROWID""")
+
+def create_window_table(cur, table, key_columns):
+    """
+    Create a table of packed game windows (see feature_codec), converting
+    the rows of a table that still has a column for every window value.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    table : str
+        Name of the table.
+    key_columns : list[str]
+        Definitions of the columns between id and the pregame elos,
+        e.g. ["game_id INTEGER"].
+    """
+    columns = table_columns(cur, table)
+    if "windows" in columns:
+        return
+
+    rows = []
+    if columns:
+        rows = cur.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()
+        cur.execute(f"DROP TABLE {table}")
+
+    cur.execute(f"""
+    CREATE TABLE {table} (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+        {", ".join(key_columns)},
+        home_pregame_elo INTEGER,
+        away_pregame_elo INTEGER,
+        week_number INTEGER,
+        windows BLOB
+    )""")
+
+    # old layout: id, keys, home elo, home windows, away elo, away windows, week
+    n_keys = len(key_columns) + 1
+    side_length = 1 + len(feature_codec.STATS)*feature_codec.WINDOW
+    packed = []
+    for row in rows:
+        home = row[n_keys:n_keys + side_length]
+        away = row[n_keys + side_length:n_keys + 2*side_length]
+        windows = np.array([home[1:], away[1:]]).reshape(feature_codec.SHAPE)
+        packed.append((*row[:n_keys], home[0], away[0], row[-1], feature_codec.pack(windows)))
+    cur.executemany(f"INSERT INTO {table} VALUES ({', '.join(['?']*(n_keys + 4))})", packed)
+
+def create_feature_tables(cur):
+    """
+    MLData, InferenceData, AiInput and TeamAiData.
+    """
+    create_window_table(cur, "MLData", ["game_id INTEGER"])
+    create_window_table(cur, "InferenceData", ["game_id INTEGER"])
+    create_window_table(cur, "TeamAiData", ["team_id INTEGER", "home_team INTEGER"])
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS AiInput (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE,
+        game_id INTEGER,
+        ai_spread REAL,
+        elo_diff REAL,
+        point_diff REAL,
+        yard_diff REAL,
+        turnover_diff REAL,
+        elo_pred_spread REAL
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inferencedata_game ON InferenceData (game_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_aiinput_game ON AiInput (game_id)")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_teamaidata_team ON TeamAiData (team_id)")
+
+def create_stage_table(cur):
+    """
+    StageFingerprints, written by pipeline.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS StageFingerprints (
+        stage TEXT PRIMARY KEY,
+        fingerprint TEXT,
+        seconds REAL,
+        finished_at TEXT
+    )""")
+
+def add_version_counter(cur, table, columns=None):
+    """
+    Keep a version counter of `table` in the TableVersions table, bumped
+    by triggers on every insert, update and delete.
+
+    The generation is random so that a database created from scratch
+    never reuses the version of an earlier one.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    table : str
+    columns : list[str]
+        Only updates of these columns bump the version. Default is None
+        which counts every update.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS TableVersions (
+        name TEXT PRIMARY KEY,
+        generation TEXT,
+        version INTEGER
+    )""")
+    cur.execute("""INSERT OR IGNORE INTO TableVersions (name, generation, version)
+                VALUES (?, lower(hex(randomblob(8))), 0)""", (table,))
+    update = f"UPDATE OF {', '.join(columns)}" if columns else "UPDATE"
+    for event, trigger_event in (("insert", "INSERT"), ("update", update), ("delete", "DELETE")):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table.lower()}_version_{event} AFTER {trigger_event} ON {table}
+        BEGIN
+            UPDATE TableVersions SET version = version + 1 WHERE name = '{table}';
+        END""")
+
+def add_games_version(cur):
+    """
+    Version counter of the Games table. game_cache uses it to tell when
+    its export is stale.
+    """
+    add_version_counter(cur, "Games")
+
+def add_lookup_versions(cur):
+    """
+    Version counters of the Teams, Seasons and Weeks tables, which registry
+    uses to tell when to reload. Team elo updates are not counted.
+    """
+    add_version_counter(cur, "Teams", ["name", "ticker", "latitude", "longitude"])
+    add_version_counter(cur, "Seasons")
+    add_version_counter(cur, "Weeks")
+
+def create_playoff_odds_table(cur):
+    """
+    PlayoffOdds, written by season_sim. One column per playoff seed, seven
+    as in season_sim.PLAYOFF_SEEDS.
+    """
+    seed_columns = "".join(f"seed_{seed_num} REAL,\n" for seed_num in range(1, 8))
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS PlayoffOdds (
+        season_id INTEGER,
+        week INTEGER,
+        team_id INTEGER,
+        simulations INTEGER,
+        wins REAL,
+        division REAL,
+        playoffs REAL,
+        {seed_columns}
+        PRIMARY KEY (season_id, week, team_id)
+    )""")
+
+def add_games_unique_key(cur):
+    """
+    A team hosts at most one game a week, so re-ingesting a week cannot add
+    its games again. Copies left by earlier re-ingests are deleted first,
+    keeping the first copy of each game and the feature rows built from it.
+    """
+    duplicates = """SELECT id FROM Games WHERE home_team_id IS NOT NULL and id NOT IN
+                 (SELECT min(id) FROM Games GROUP BY season_id, week_id, home_team_id)"""
+    for table in ("MLData", "InferenceData", "AiInput"):
+        cur.execute(f"DELETE FROM {table} WHERE game_id IN ({duplicates})")
+    cur.execute(f"DELETE FROM Games WHERE id IN ({duplicates})")
+    cur.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_games_unique
+                ON Games (season_id, week_id, home_team_id)""")
+
+# append only, the position of a migration is its version
+MIGRATIONS = [
+    create_core_tables,
+    add_team_ids,
+    create_elo_tables,
+    create_feature_tables,
+    create_stage_table,
+    add_games_version,
+    add_lookup_versions,
+    create_playoff_odds_table,
+    add_games_unique_key,
+]
+
+def migrate(conn):
+    """
+    Apply the migrations that the database is missing.
+
+    Parameters
+    ----------
+    conn : sqlite connection object
+
+    Returns
+    -------
+    list[int]
+        Versions that were applied.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS SchemaVersion (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TEXT
+    )""")
+    conn.commit()
+    done = {row[0] for row in cur.execute("SELECT version FROM SchemaVersion")}
+
+    applied = []
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version in done:
+            continue
+        cur.execute("BEGIN")
+        try:
+            migration(cur)
+            cur.execute("""INSERT INTO SchemaVersion (version, name, applied_at)
+                        VALUES (?, ?, datetime('now'))""", (version, migration.__name__))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def clear_tables(cur, tables):
+    """
+    Delete every row of `tables` and restart their ids at 1, for the
+    pipeline stages that rebuild a table from scratch.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    tables : list[str]
+    """
+    for table in tables:
+        cur.execute(f"DELETE FROM {table}")
+    cur.execute(f"DELETE FROM sqlite_sequence WHERE name in ({', '.join(['?']*len(tables))})",
+                tables)
+
+if __name__ == '__main__':
+    conn = sqlite3.connect('db.sqlite')
+    print("applied migrations:", migrate(conn) or "none")
+    conn.close()
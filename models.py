@@ -1,10 +1,21 @@
 """
 This module contains the saved models developed for the 
 AI portion of the website.
+
+`get` keeps one instance of each model version per process in eval mode,
+so scoring a game does not read the weights from disk. A version is only
+loaded again when its weight file changes on disk (see weight_cache).
 """
 
+import io
+import os
+import numpy as np
 import torch
 from torch import nn
+import weight_cache
+
+# rows per forward pass in `predict`
+CHUNK_SIZE = 4096
 
 class V1NeuralNetwork(nn.Module):
     def __init__(self):
@@ -19,6 +30,48 @@ class V1NeuralNetwork(nn.Module):
         output = self.linear_relu_stack(x)
         return output
 
+# version: (model class, weight file)
+VERSIONS = {
+    "v1": (V1NeuralNetwork, os.path.join('models', 'v1.pth')),
+}
+
+def _load(version, weights):
+    """
+    Build a model version from the bytes of its weight file.
+    """
+    model_class, _ = VERSIONS[version]
+    model = model_class()
+    model.load_state_dict(torch.load(io.BytesIO(weights)))
+    model.eval()
+    return model
+
+_cache = weight_cache.WeightCache(_load)
+
+def get(version="v1"):
+    """
+    The resident instance of a model version, loaded on first use and
+    reloaded after its weight file changed, see weight_cache.
+
+    Parameters
+    ----------
+    version : str
+        A key of VERSIONS.
+
+    Returns
+    -------
+    torch model
+        In eval mode. Shared by every caller in the process, do not
+        train or modify it.
+    """
+    return _cache.get(version, VERSIONS[version][1])
+
+def counters():
+    """
+    Weight loads and cache hits of `get` since the process started, see
+    weight_cache.WeightCache.counters.
+    """
+    return _cache.counters()
+
 def v1():
     """
     The version 1 neural network. Takes point_diff_diff,
@@ -28,9 +81,33 @@ def v1():
     Returns
     -------
     torch model
-        Version 1 neural network with trained parameter values.
+        Version 1 neural network with trained parameter values,
+        the instance shared by the process, see `get`.
     """
-    model = V1NeuralNetwork()
-    model.load_state_dict(torch.load('models/v1.pth'))
-    model.eval()
-    return model
\ No newline at end of file
+    return get("v1")
+
+def predict(model, features, chunk_size=CHUNK_SIZE):
+    """
+    Model outputs for many rows of inputs, a forward pass per chunk of
+    rows with autograd turned off.
+
+    Parameters
+    ----------
+    model : torch model
+        e.g. from `v1`.
+    features : array_like
+        Shape (n_rows, n_inputs).
+    chunk_size : int
+        Number of rows per forward pass.
+
+    Returns
+    -------
+    np.ndarray
+        Shape (n_rows,), float32.
+    """
+    inputs = torch.as_tensor(np.asarray(features, dtype=np.float32))
+    outputs = np.empty(len(inputs), dtype=np.float32)
+    with torch.inference_mode():
+        for start in range(0, len(inputs), chunk_size):
+            outputs[start:start + chunk_size] = model(inputs[start:start + chunk_size])[:, 0].numpy()
+    return outputs
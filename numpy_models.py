@@ -0,0 +1,216 @@
+"""
+NumPy inference for the saved models, so the web process can score games
+without importing torch.
+
+The models in `models` are small multilayer perceptrons: linear layers
+with a ReLU between them. `export` writes the weights of a trained torch
+model to a .npz file next to its .pth file, and `get` serves the model
+from that file with the same matrix products. Training and
+exporting still use torch. The export records the hash of the .pth it
+was made from, and the pipeline's ai_input stage exports again when the
+.pth changed (see `export_if_stale`); running this file exports every
+version by hand, e.g.
+    python numpy_models.py
+"""
+
+import hashlib
+import io
+import os
+import numpy as np
+import weight_cache
+
+# rows per matrix product in `predict`
+CHUNK_SIZE = 4096
+
+# version: exported weight file, see `export`
+VERSIONS = {
+    "v1": os.path.join('models', 'v1.npz'),
+}
+
+# version: torch weight file it is exported from, as in models.VERSIONS
+SOURCES = {
+    "v1": os.path.join('models', 'v1.pth'),
+}
+
+class NumpyMLP:
+    """
+    Linear layers with a ReLU after every layer but the last, the NumPy
+    equivalent of an nn.Sequential of nn.Linear and nn.ReLU.
+
+    The float32 weights are multiplied in float64 and the outputs rounded
+    to float32, so an output does not depend on how many rows are scored
+    together, which it does for float32 matrix products.
+
+    Parameters
+    ----------
+    layers : list[tuple[np.ndarray, np.ndarray]]
+        (weight, bias) of each linear layer in order, weight with shape
+        (n_outputs, n_inputs) like nn.Linear.weight.
+    """
+    def __init__(self, layers):
+        self.layers = [(np.ascontiguousarray(np.asarray(weight, dtype=np.float32).T, dtype=np.float64),
+                        np.asarray(bias, dtype=np.float32).astype(np.float64))
+                       for weight, bias in layers]
+
+    def __call__(self, x):
+        """
+        Outputs of the model.
+
+        Parameters
+        ----------
+        x : array_like
+            Shape (n_rows, n_inputs).
+
+        Returns
+        -------
+        np.ndarray
+            Shape (n_rows, n_outputs), float32.
+        """
+        x = np.asarray(x, dtype=np.float32).astype(np.float64)
+        for layer, (weight, bias) in enumerate(self.layers):
+            x = x @ weight + bias
+            if layer < len(self.layers) - 1:
+                np.maximum(x, 0, out=x)
+        return x.astype(np.float32)
+
+    @classmethod
+    def from_npz(cls, f):
+        """
+        Model from weights written by `export`.
+
+        Parameters
+        ----------
+        f : str or file-like object
+        """
+        with np.load(f) as weights:
+            n_layers = sum(name.startswith("weight_") for name in weights.files)
+            return cls([(weights[f"weight_{layer}"], weights[f"bias_{layer}"])
+                        for layer in range(n_layers)])
+
+def export(version="v1"):
+    """
+    Write the weights of a trained torch model to its file in VERSIONS.
+
+    Imports torch, which serving does not need.
+
+    Parameters
+    ----------
+    version : str
+        A key of models.VERSIONS and VERSIONS.
+
+    Returns
+    -------
+    str
+        Path of the written file.
+    """
+    import torch
+    import models
+
+    model_class, path = models.VERSIONS[version]
+    model = model_class()
+    model.load_state_dict(torch.load(path))
+    linear = [module for module in model.modules() if isinstance(module, torch.nn.Linear)]
+    weights = {}
+    for layer, module in enumerate(linear):
+        weights[f"weight_{layer}"] = module.weight.detach().numpy().astype(np.float32)
+        weights[f"bias_{layer}"] = module.bias.detach().numpy().astype(np.float32)
+
+    out = VERSIONS[version]
+    with open(out + ".tmp", "wb") as f:
+        np.savez(f, source=np.array(source_hash(version)), **weights)
+    os.replace(out + ".tmp", out)
+    return out
+
+def source_hash(version):
+    """
+    SHA-256 of the torch weight file of a version, see SOURCES.
+    """
+    with open(SOURCES[version], "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def exported_from(version):
+    """
+    SHA-256 of the torch weight file the current export of a version
+    was made from, None if it was never exported.
+    """
+    try:
+        with np.load(VERSIONS[version]) as weights:
+            return str(weights["source"]) if "source" in weights.files else None
+    except FileNotFoundError:
+        return None
+
+def export_if_stale(version="v1"):
+    """
+    Export a version again if its torch weight file changed since the
+    last export, so retrained weights cannot be left unexported.
+
+    Only imports torch when it exports.
+
+    Parameters
+    ----------
+    version : str
+        A key of VERSIONS.
+
+    Returns
+    -------
+    bool
+        Whether the version was exported.
+    """
+    if exported_from(version) == source_hash(version):
+        return False
+    export(version)
+    return True
+
+_cache = weight_cache.WeightCache(lambda version, weights: NumpyMLP.from_npz(io.BytesIO(weights)))
+
+def get(version="v1"):
+    """
+    The resident instance of a model version, loaded on first use and
+    reloaded after its weight file changed, see weight_cache.
+
+    Parameters
+    ----------
+    version : str
+        A key of VERSIONS.
+
+    Returns
+    -------
+    NumpyMLP
+        Shared by every caller in the process, do not modify.
+    """
+    return _cache.get(version, VERSIONS[version])
+
+def counters():
+    """
+    Weight loads and cache hits of `get` since the process started, see
+    weight_cache.WeightCache.counters.
+    """
+    return _cache.counters()
+
+def predict(model, features, chunk_size=CHUNK_SIZE):
+    """
+    Model outputs for many rows of inputs, the NumPy `models.predict`.
+
+    Parameters
+    ----------
+    model : NumpyMLP
+        e.g. from `get`.
+    features : array_like
+        Shape (n_rows, n_inputs).
+    chunk_size : int
+        Number of rows per matrix product.
+
+    Returns
+    -------
+    np.ndarray
+        Shape (n_rows,), float32.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    outputs = np.empty(len(features), dtype=np.float32)
+    for start in range(0, len(features), chunk_size):
+        outputs[start:start + chunk_size] = model(features[start:start + chunk_size])[:, 0]
+    return outputs
+
+if __name__ == '__main__':
+    for version in VERSIONS:
+        print(f"exported {version} to {export(version)}")
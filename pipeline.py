@@ -0,0 +1,194 @@
+"""
+Builds the database from the data files in stages, skipping the stages
+that are already up to date.
+
+When a stage finishes it records a fingerprint of its inputs in the
+StageFingerprints table: the hashes of the files it reads, the constants
+it uses and the fingerprint recorded by the stage it builds on. A stage
+only runs again when its fingerprint changes, so swapping the model file
+rescores AiInput without rebuilding the games, the Elo history or the
+game windows.
+
+Running this file updates the database, e.g.
+    python pipeline.py --stage ai_input --force
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import elo_model
+import elo_sim
+import features
+import game_cache
+import init_db
+import migrations
+import numpy_models
+import process_inference_data
+
+DB_PATH = 'db.sqlite'
+DATA_DIR = 'data'
+
+def file_hash(path):
+    """
+    SHA-256 of the bytes of a file.
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def data_inputs():
+    """
+    Hash of every season file read by init_db.
+    """
+    return {file: file_hash(os.path.join(DATA_DIR, file))
+            for file in sorted(os.listdir(DATA_DIR))}
+
+def elo_inputs():
+    """
+    Constants of the Elo model and the replay.
+    """
+    return {
+        "initial_elo": elo_sim.INITIAL_ELO,
+        "k": elo_model.K_FACTOR,
+        "home_field_advantage": elo_model.HOME_FIELD_ADVANTAGE,
+        "mean": elo_model.MEAN_ELO,
+        "regression": elo_model.REGRESSION_TO_MEAN,
+        "travel_per_mile": elo_model.TRAVEL_ELO_PER_MILE,
+        "mov_constant": elo_model.MOV_CONSTANT,
+        "mov_elo_scale": elo_model.MOV_ELO_SCALE,
+    }
+
+def model_inputs():
+    """
+    Hash of the trained model weights. The stage exports the NumPy copy
+    it scores with from them, see numpy_models.export_if_stale.
+    """
+    return {"model": file_hash(numpy_models.SOURCES["v1"])}
+
+def games_inputs():
+    """
+    Version of the Games table, which changes with every game written.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    version = game_cache.games_version(conn.cursor())
+    conn.close()
+    return {"games_version": version}
+
+def no_inputs():
+    """
+    For stages that only read the output of the stage before them.
+    """
+    return {}
+
+# name: (function that builds the stage's tables, stage it builds on, its own inputs)
+STAGES = {
+    "games": (init_db.run, None, data_inputs),
+    "elo": (elo_sim.run, "games", elo_inputs),
+    "game_cache": (game_cache.run, "elo", games_inputs),
+    "features": (features.run, "elo", no_inputs),
+    "ai_input": (process_inference_data.score, "features", model_inputs),
+}
+
+def fingerprint(inputs, upstream):
+    """
+    Fingerprint of a stage.
+
+    Parameters
+    ----------
+    inputs : dict
+        JSON serializable inputs of the stage.
+    upstream : str
+        Recorded fingerprint of the stage it builds on, None if there is
+        no such stage or it has never finished.
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    state = json.dumps({"inputs": inputs, "upstream": upstream}, sort_keys=True)
+    return hashlib.sha256(state.encode()).hexdigest()
+
+def run(stages=None, force=False):
+    """
+    Run the stages whose fingerprint changed since they last finished.
+
+    Parameters
+    ----------
+    stages : list[str]
+        Names of the stages to consider, in any order. Default is None
+        which considers every stage in STAGES.
+    force : bool
+        If True the stages considered run even if they are up to date.
+
+    Returns
+    -------
+    list[tuple[str, bool, float]]
+        (stage, whether it ran, seconds) of each stage considered.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+    migrations.migrate(conn)
+    recorded = dict(cur.execute("SELECT stage, fingerprint FROM StageFingerprints"))
+
+    # a database built before the stages were fingerprinted has games but no
+    # row for the games stage. Rebuilding them would drop the games ingested
+    # during the season, which are in no data file, so they are taken as built
+    # from the data files on disk. --force still rebuilds them.
+    if "games" not in recorded and cur.execute("SELECT 1 FROM Games LIMIT 1").fetchone():
+        recorded["games"] = fingerprint(data_inputs(), None)
+        cur.execute("""INSERT INTO StageFingerprints (stage, fingerprint, seconds, finished_at)
+                    VALUES ('games', ?, 0, datetime('now'))""", (recorded["games"],))
+        conn.commit()
+
+    results = []
+    for name, (build, upstream, inputs) in STAGES.items():
+        if stages is not None and name not in stages:
+            continue
+
+        start = time.perf_counter()
+        current = fingerprint(inputs(), recorded.get(upstream))
+        ran = force or recorded.get(name) != current
+        if ran:
+            # a stage that fails part way is left with an empty fingerprint so it runs next time
+            cur.execute("""INSERT OR REPLACE INTO StageFingerprints (stage, fingerprint, seconds, finished_at)
+                        VALUES (?, NULL, NULL, NULL)""", (name,))
+            conn.commit()
+            recorded[name] = None
+
+            build()
+
+            seconds = time.perf_counter() - start
+            cur.execute("""INSERT OR REPLACE INTO StageFingerprints (stage, fingerprint, seconds, finished_at)
+                        VALUES (?, ?, ?, datetime('now'))""", (name, current, seconds))
+            conn.commit()
+            recorded[name] = current
+
+        seconds = time.perf_counter() - start
+        results.append((name, ran, seconds))
+        print(f"{name:<12}{'ran' if ran else 'skipped':<9}{seconds:.3f}s")
+
+    conn.close()
+    print(f"{'total':<21}{sum(result[2] for result in results):.3f}s")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the database tables that are out of date.")
+    parser.add_argument("--stage", action="append", choices=list(STAGES),
+                        help="only consider this stage, can be given more than once")
+    parser.add_argument("--force", action="store_true",
+                        help="run the stages considered even if they are up to date")
+    args = parser.parse_args()
+
+    run(args.stage, args.force)
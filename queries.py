@@ -0,0 +1,73 @@
+"""
+SQL behind the website routes, kept in one place so that the query plans
+can be checked against the indexes created by migrations, see
+tests/test_query_plans.py.
+
+Running this file prints the plan of every serving query.
+"""
+
+import sqlite3
+
+WEEK_GAMES = """SELECT Games.id, Games.season_id, Games.week_id, Games.home_team,
+             Games.away_team, Games.home_points, Games.away_points, Games.home_yards,
+             Games.away_yards, Games.home_turnovers, Games.away_turnovers,
+             Games.home_pregame_elo, Games.away_pregame_elo, Games.playoffs,
+             Games.home_bye, Games.away_bye, Games.neutral_destination
+             FROM Games
+             WHERE Games.week_id = (SELECT id FROM Weeks WHERE week = ?)
+             and Games.season_id = (SELECT id FROM Seasons WHERE season = ?)"""
+
+AI_GAMES = """SELECT Games.home_team, Games.away_team,
+           Games.home_points, Games.away_points,
+           AiInput.elo_pred_spread, AiInput.ai_spread
+           FROM Games JOIN AiInput on Games.id = AiInput.game_id
+           WHERE Games.week_id = (SELECT id FROM Weeks WHERE week = ?)
+           and Games.season_id = (SELECT id FROM Seasons WHERE season = ?)"""
+
+TEAM = """SELECT * FROM Teams WHERE name = ?"""
+
+# in the order the games were played, the playoff weeks after the regular season
+TEAM_ELO_HISTORY = """SELECT Seasons.season, Weeks.week, EloHistory.pre, EloHistory.post
+                   FROM EloHistory JOIN Seasons JOIN Weeks
+                   on EloHistory.season_id = Seasons.id and EloHistory.week_id = Weeks.id
+                   WHERE EloHistory.team_id = (SELECT id FROM Teams WHERE name = ?)
+                   ORDER BY Seasons.season,
+                   CASE Weeks.week WHEN 'WildCard' THEN 100 WHEN 'Division' THEN 101
+                   WHEN 'ConfChamp' THEN 102 WHEN 'SuperBowl' THEN 103
+                   ELSE CAST(Weeks.week AS INTEGER) END"""
+
+# query and example parameters for each route
+SERVING_QUERIES = {
+    "/games/<season>/<week>": (WEEK_GAMES, ("1", "2022-2023")),
+    "/ai-games/<season>/<week>": (AI_GAMES, ("1", "2022-2023")),
+    "/team/<name>": (TEAM, ("Chicago Bears",)),
+    "/team/<name>/elo": (TEAM_ELO_HISTORY, ("Chicago Bears",)),
+}
+
+def full_scans(cur, query, params):
+    """
+    Steps of a query's plan that read a whole table.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+    query : str
+    params : tuple
+        Parameters bound to the query.
+
+    Returns
+    -------
+    list[str]
+        e.g. ["SCAN Games"], empty if every table is searched through an index.
+    """
+    plan = cur.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    return [step[3] for step in plan if step[3].startswith("SCAN")]
+
+if __name__ == '__main__':
+    conn = sqlite3.connect('db.sqlite')
+    cur = conn.cursor()
+    for route, (query, params) in SERVING_QUERIES.items():
+        print(route)
+        for step in cur.execute("EXPLAIN QUERY PLAN " + query, params).fetchall():
+            print("   ", step[3])
+    conn.close()
@@ -0,0 +1,194 @@
+"""
+Teams, seasons and weeks.
+
+The team metadata that every module used to carry its own copy of lives
+here, together with the names teams played under before they moved.
+`get` loads the Teams, Seasons and Weeks tables once per process into
+lookup dicts and only reloads them when one of those tables changed,
+which triggers record in the TableVersions table (see migrations), so
+loops over games resolve names and ids without issuing SQL.
+"""
+
+import threading
+import elo_model
+
+# name: [latitude, longitude, ticker], in the order the teams are inserted
+TEAMS = {
+    "Kansas City Chiefs": [39.099789, -94.578560, "KC"],
+    "Houston Texans": [29.760427, -95.369804, "HOU"],
+    "Seattle Seahawks": [47.603230, -122.330276, "SEA"],
+    "Atlanta Falcons": [33.748997, -84.387985, "ATL"],
+    "Buffalo Bills": [42.887691, -78.879372, "BUF"],
+    "New York Jets": [40.814947462026176, -74.07665577312015, "NYJ"],
+    "Las Vegas Raiders": [36.13138384905654, -115.13169451756163, "LV"],
+    "Carolina Panthers": [35.25251233973856, -80.84120226587098, "CAR"],
+    "Chicago Bears": [41.84754487986402, -87.67153913855199, "CHI"],
+    "Detroit Lions": [42.36480313066512, -83.08960351424362, "DET"],
+    "Baltimore Ravens": [39.308003294731584, -76.6205088127477, "BAL"],
+    "Cleveland Browns": [41.46606790678101, -81.67222601665915, "CLE"],
+    "Jacksonville Jaguars": [30.373130908558224, -81.68590701566833, "JAC"],
+    "Indianapolis Colts": [39.82165042217416, -86.14927731202125, "IND"],
+    "Green Bay Packers": [44.52030015455375, -88.02808200465094, "GB"],
+    "Minnesota Vikings": [44.95461717252483, -93.16928759979443, "MIN"],
+    "New England Patriots": [42.09250215474584, -71.2639840458412, "NE"],
+    "Miami Dolphins": [25.958159412628838, -80.23881748795804, "MIA"],
+    "Washington Commanders": [38.907843649151665, -76.86454540290117, "WAS"],
+    "Philadelphia Eagles": [39.90153409172584, -75.1675215028637, "PHI"],
+    "Los Angeles Chargers": [33.95369646674758, -118.33909324725614, "LAC"],
+    "Cincinnati Bengals": [39.095483938138024, -84.51594106292978, "CIN"],
+    "Arizona Cardinals": [33.52738095014831, -112.26238094759978, "ARI"],
+    "San Francisco 49ers": [37.4032482976688, -121.96987092942953, "SF"],
+    "New Orleans Saints": [29.95130267822774, -90.08121201668786, "NO"],
+    "Tampa Bay Buccaneers": [27.976153335923133, -82.50335586092449, "TB"],
+    "Los Angeles Rams": [33.95369646674758, -118.33909324725614, "LAR"],
+    "Dallas Cowboys": [32.7480062696302, -97.09303478136525, "DAL"],
+    "Pittsburgh Steelers": [40.4470587094102, -80.01595342189762, "PIT"],
+    "New York Giants": [40.814947462026176, -74.07665577312015, "NYG"],
+    "Tennessee Titans": [36.16623854753519, -86.77101512830522, "TEN"],
+    "Denver Broncos": [39.74381523382964, -105.02021669123351, "DEN"],
+}
+
+# homes of teams before they moved, not in the Teams table
+# TODO account for teams that moved
+FORMER_TEAMS = {
+    "St. Louis Rams": [38.627003, -90.199402, "STL"],
+    "San Diego Chargers": [32.71533, -117.15726, "SD"],
+    "Oakland Raiders": [37.804363, -122.271111, "OAK"],
+}
+
+# superbowl location of each year, for the games at a neutral site
+SUPERBOWL_LOCATIONS = {
+    '2011': 'DAL',
+    '2012': 'IND',
+    '2013': 'NO',
+    '2014': 'NYG',
+    '2015': 'ARI',
+    '2016': 'SF',
+    '2017': 'HOU',
+    '2018': 'MIN',
+    '2019': 'ATL',
+    '2020': 'MIA',
+    '2021': 'TB',
+    '2022': 'LAR',
+    '2023': 'ARI' ,
+    '2024': 'LV',
+    '2025': 'NO'
+}
+
+# old names of teams that moved, Washington is matched on the city alone
+TEAM_ALIASES = {
+    'Oakland Raiders': 'Las Vegas Raiders',
+    'San Diego Chargers': 'Los Angeles Chargers',
+    'St. Louis Rams': 'Los Angeles Rams',
+    'Washington Redskins': 'Washington Commanders',
+    'Washington Football Team': 'Washington Commanders',
+}
+
+def canonical_team(name):
+    """
+    Current name of a team.
+
+    Parameters
+    ----------
+    name : str
+        Team name at the time of a game (e.g. "Oakland Raiders").
+
+    Returns
+    -------
+    str
+        e.g. "Las Vegas Raiders"
+    """
+    if 'Washington' in name:
+        return 'Washington Commanders'
+    return TEAM_ALIASES.get(name, name)
+
+_lock = threading.Lock()
+_cache = {"version": None, "registry": None}
+
+def tables_version(cur):
+    """
+    Versions of the Teams, Seasons and Weeks tables.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    tuple
+        Changes whenever a row of one of the tables is added, deleted or
+        renamed. Team elo updates do not change it.
+    """
+    return tuple(cur.execute("""SELECT name, generation, version FROM TableVersions
+                             WHERE name in ('Teams', 'Seasons', 'Weeks')
+                             ORDER BY name""").fetchall())
+
+def load(cur):
+    """
+    Read the Teams, Seasons and Weeks tables into lookup dicts.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    dict[str: any]
+        {"team_ids": {team name or former name: Teams.id},
+         "team_names": {Teams.id: name} ordered by id,
+         "ticker_ids": {ticker: Teams.id},
+         "season_ids": {season: Seasons.id},
+         "season_lengths": {Seasons.id: number of regular season weeks},
+         "week_ids": {week: Weeks.id},
+         "week_names": {Weeks.id: week},
+         "travel_table": elo_model.build_travel_table with the default constants}
+    """
+    teams = cur.execute("SELECT id, name, ticker FROM Teams ORDER BY id").fetchall()
+    seasons = cur.execute("SELECT id, season, length FROM Seasons ORDER BY id").fetchall()
+    weeks = cur.execute("SELECT id, week FROM Weeks ORDER BY id").fetchall()
+
+    team_ids = {name: team_id for team_id, name, _ in teams}
+    for name in list(TEAM_ALIASES) + list(FORMER_TEAMS):
+        if canonical_team(name) in team_ids:
+            team_ids[name] = team_ids[canonical_team(name)]
+
+    return {
+        "team_ids": team_ids,
+        "team_names": {team_id: name for team_id, name, _ in teams},
+        "ticker_ids": {ticker: team_id for team_id, _, ticker in teams},
+        "season_ids": {season: season_id for season_id, season, _ in seasons},
+        "season_lengths": {season_id: length for season_id, _, length in seasons},
+        "week_ids": {week: week_id for week_id, week in weeks},
+        "week_names": {week_id: week for week_id, week in weeks},
+        "travel_table": elo_model.build_travel_table(cur),
+    }
+
+def get(cur):
+    """
+    The registry of the database `cur` reads from, loaded on first use
+    and reloaded after the Teams, Seasons or Weeks table changed.
+
+    Parameters
+    ----------
+    cur : sqlite db cursor
+
+    Returns
+    -------
+    dict[str: any]
+        See `load`. Shared by every caller in the process, do not modify.
+    """
+    version = tables_version(cur)
+    registry = _cache["registry"]
+    if _cache["version"] != version:
+        with _lock:
+            registry = load(cur)
+            _cache["version"], _cache["registry"] = version, registry
+    return registry
+
+def invalidate():
+    """
+    Drop the loaded registry, e.g. after a transaction that changed the
+    tables was rolled back, which also rolls back their version counters.
+    """
+    with _lock:
+        _cache["version"], _cache["registry"] = None, None
@@ -0,0 +1,262 @@
+"""
+Windows of every team's last games, the state behind the MLData,
+InferenceData and TeamAiData tables.
+
+`lagged_windows` builds the windows of a whole game history at once;
+`RollingTeamStats` keeps windows with a running sum per team and stat
+while the games of the weekly ingest are added one at a time.
+"""
+
+import numpy as np
+import feature_codec
+
+def game_stats(home_pregame_elo, away_pregame_elo, home_points, away_points,
+               home_yards, away_yards, home_turnovers, away_turnovers):
+    """
+    Stats of one game from the point of view of both teams.
+
+    Returns
+    -------
+    np.ndarray
+        Shape (2, len(feature_codec.STATS)), the home team's stats first.
+        The "turnovers_for" of a team are the turnovers of its opponent.
+    """
+    return np.array([[home_pregame_elo, away_pregame_elo, home_points, away_points,
+                      home_yards, away_yards, away_turnovers, home_turnovers],
+                     [away_pregame_elo, home_pregame_elo, away_points, home_points,
+                      away_yards, home_yards, home_turnovers, away_turnovers]], dtype=np.int64)
+
+class RollingTeamStats:
+    """
+    The last `window` games of each team for every stat in
+    feature_codec.STATS.
+
+    Every game is written to two slots `window` apart in a ring of
+    2*`window` slots, so the games in a window are always one contiguous
+    slice of the ring and `games` returns a view instead of a copy. The
+    running sums make the mean of a window a read instead of a sum.
+
+    Parameters
+    ----------
+    n_teams : int
+        Number of teams, which are referred to by index in [0, n_teams).
+    window : int
+        Number of games kept per team.
+    """
+    def __init__(self, n_teams, window=feature_codec.WINDOW):
+        self.window = window
+        self.ring = np.zeros((n_teams, len(feature_codec.STATS), 2*window), dtype=np.int64)
+        self.sums = np.zeros((n_teams, len(feature_codec.STATS)), dtype=np.int64)
+        # slot the team's next game is written to and the number of games kept,
+        # plain lists as numpy scalars are slow to index one at a time
+        self.next = [0]*n_teams
+        self.count = [0]*n_teams
+
+    def push(self, team, stats):
+        """
+        Add a game to the end of a team's window, dropping the oldest
+        game once the window is full.
+
+        Parameters
+        ----------
+        team : int
+        stats : array_like
+            The team's stats in the game, in feature_codec.STATS order.
+        """
+        slot = self.next[team]
+        ring = self.ring[team]
+        # an empty slot holds zeros, so the sum is right before the window fills up
+        self.sums[team] += stats - ring[:, slot]
+        # writes both copies of the slot
+        ring[:, slot::self.window] = np.asarray(stats)[:, np.newaxis]
+        self.next[team] = (slot + 1) % self.window
+        self.count[team] = min(self.count[team] + 1, self.window)
+
+    def load(self, teams, games):
+        """
+        Replace the windows of some teams.
+
+        Parameters
+        ----------
+        teams : array_like
+            Indices of the teams.
+        games : array_like
+            Shape (len(teams), len(feature_codec.STATS), n_games) with the
+            oldest game first and at most `window` games, e.g. from
+            feature_codec.unpack_many.
+        """
+        teams = np.asarray(teams, dtype=np.intp)
+        games = np.asarray(games, dtype=np.int64)
+        n_games = games.shape[-1]
+        # the state `push` leaves after adding the games to empty windows
+        self.ring[teams] = 0
+        self.ring[teams, :, :n_games] = games
+        self.ring[teams, :, self.window:self.window + n_games] = games
+        self.sums[teams] = games.sum(axis=-1)
+        for team in teams.tolist():
+            self.next[team] = n_games % self.window
+            self.count[team] = n_games
+
+    def games(self, team):
+        """
+        A team's window.
+
+        Parameters
+        ----------
+        team : int
+
+        Returns
+        -------
+        np.ndarray
+            View with shape (len(feature_codec.STATS), n_games), the oldest
+            game first. It changes with the next `push` to the team.
+        """
+        count = self.count[team]
+        start = (self.next[team] - count) % self.window
+        return self.ring[team, :, start:start + count]
+
+    def means(self, team):
+        """
+        Mean of each stat over a team's window.
+
+        Parameters
+        ----------
+        team : int
+
+        Returns
+        -------
+        np.ndarray
+            Shape (len(feature_codec.STATS),).
+        """
+        return self.sums[team] / self.count[team]
+
+    def diffs(self, team):
+        """
+        Difference between the mean "for" and "against" stats of a team's
+        window, see feature_codec.for_against_diffs.
+
+        Returns
+        -------
+        np.ndarray
+            Shape (len(feature_codec.FEATURES),).
+        """
+        means = self.means(team)
+        return means[0::2] - means[1::2]
+
+def side_stats(games):
+    """
+    Stats of every game from the point of view of both teams, the
+    vectorized `game_stats`.
+
+    Parameters
+    ----------
+    games : dict[str: np.ndarray]
+        Game columns, e.g. from game_cache.load.
+
+    Returns
+    -------
+    home : np.ndarray
+        Shape (n_games, len(feature_codec.STATS)), the home team's stats.
+    away : np.ndarray
+        The away team's stats.
+    """
+    columns = [games[key].astype(np.int64) for key in (
+        "home_pregame_elo", "away_pregame_elo", "home_points", "away_points",
+        "home_yards", "away_yards", "home_turnovers", "away_turnovers")]
+    home_elo, away_elo, home_points, away_points, home_yards, away_yards, \
+        home_turnovers, away_turnovers = columns
+    home = np.stack((home_elo, away_elo, home_points, away_points,
+                     home_yards, away_yards, away_turnovers, home_turnovers), axis=1)
+    away = np.stack((away_elo, home_elo, away_points, home_points,
+                     away_yards, home_yards, home_turnovers, away_turnovers), axis=1)
+    return home, away
+
+def lagged_windows(games, seed, selections, window=feature_codec.WINDOW):
+    """
+    Windows of both teams' last games before each selected game, built
+    with whole-array operations instead of pushing games one at a time.
+
+    The games are exploded into a long table with one row per team per
+    game, sorted by team and then by game, so the `window` rows before a
+    team's row are its window. The seed games come before every selected
+    game of a team, in the order they were played. The table is built and
+    sorted once for all selections.
+
+    The seed games keep the quirk of the loop they replace: once a team
+    played a seed game at home, its later seed games are all stored from
+    the home team's point of view.
+
+    Parameters
+    ----------
+    games : dict[str: np.ndarray]
+        Game columns ordered by Games.id, e.g. from game_cache.load.
+    seed : np.ndarray
+        Mask of the games that fill the windows before the first selected
+        game. Every team needs exactly `window` of them.
+    selections : list[np.ndarray]
+        Masks of the games to build windows for. Only the seed games and
+        a selection's own games enter its windows, each selected game after
+        its own windows are taken.
+    window : int
+        Number of games in a window.
+
+    Returns
+    -------
+    list[np.ndarray]
+        For each selection, shape (n_selected, 2, len(feature_codec.STATS),
+        window) with the home team first and the oldest game first, like
+        feature_codec.unpack_many.
+    """
+    home_stats, away_stats = side_stats(games)
+    home_team = games["home_team_id"]
+    away_team = games["away_team_id"]
+    position = np.arange(len(home_team))
+
+    # seed rows, the away team's point of view is replaced by the home team's
+    # once the away team hosted an earlier seed game
+    seed_idx = np.flatnonzero(seed)
+    first_home = np.full(max(home_team.max(initial=0), away_team.max(initial=0)) + 1,
+                         len(home_team))
+    np.minimum.at(first_home, home_team[seed_idx], seed_idx)
+    after_home = seed_idx > first_home[away_team[seed_idx]]
+    seed_away_stats = np.where(after_home[:, np.newaxis], home_stats[seed_idx], away_stats[seed_idx])
+
+    seed_counts = np.bincount(np.concatenate((home_team[seed_idx], away_team[seed_idx])))
+    assert (seed_counts[seed_counts > 0] == window).all(), "every team needs a full window of seed games"
+
+    selected_idx = np.flatnonzero(np.logical_or.reduce(selections))
+    n_seed, n_selected = len(seed_idx), len(selected_idx)
+    team = np.concatenate((home_team[seed_idx], away_team[seed_idx],
+                           home_team[selected_idx], away_team[selected_idx]))
+    phase = np.repeat([0, 1], (2*n_seed, 2*n_selected))
+    order = np.concatenate((position[seed_idx], position[seed_idx],
+                            position[selected_idx], position[selected_idx]))
+    stats = np.concatenate((home_stats[seed_idx], seed_away_stats,
+                            home_stats[selected_idx], away_stats[selected_idx]))
+
+    info = np.iinfo(feature_codec.DTYPE)
+    if stats.size and (stats.min() < info.min or stats.max() > info.max):
+        raise ValueError("game stats do not fit in an int16")
+
+    # a team's rows are contiguous after the sort, oldest game first
+    rows = np.lexsort((order, phase, team))
+    stats = stats[rows].astype(feature_codec.DTYPE)
+    row_of = np.empty_like(rows)
+    row_of[rows] = np.arange(len(rows))
+    home_rows = row_of[2*n_seed:2*n_seed + n_selected]
+    away_rows = row_of[2*n_seed + n_selected:]
+
+    results = []
+    for selection in selections:
+        # drop the rows of the games outside the selection, the rest stay sorted
+        in_selection = selection[selected_idx]
+        keep = (phase == 0)[rows]
+        keep[home_rows[in_selection]] = True
+        keep[away_rows[in_selection]] = True
+        kept_row = np.cumsum(keep) - 1
+
+        # windows[i] holds kept rows i to i + window - 1 with games on the last axis
+        windows = np.lib.stride_tricks.sliding_window_view(stats[keep], window, axis=0)
+        results.append(np.stack((windows[kept_row[home_rows[in_selection]] - window],
+                                 windows[kept_row[away_rows[in_selection]] - window]), axis=1))
+    return results
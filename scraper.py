@@ -42,6 +42,28 @@ def get_local_soup(filepath):
         page = f.read()
     return BeautifulSoup(page, "html.parser")
 
+def get_soup(year, local_path=None):
+    """
+    Get BeautifulSoup object of the schedule page of a season.
+
+    Parameters
+    ----------
+    year : int
+        First year in the season (e.g. 2023 for the 2023-2024 season)
+    local_path : str
+        Path to a locally stored HTML file to be used when developing/debugging. 
+        Default is None.
+
+    Returns
+    -------
+    BeautifulSoup object
+        Object from reading the page.
+    """
+    if local_path:
+        return get_local_soup(local_path)
+    page = get_upcoming_games_page(year)
+    return BeautifulSoup(page.content, "html.parser")
+
 def get_table_body(soup):
     """
     Returns
@@ -126,12 +148,7 @@ def get_week_games(week_num, year=2023, local_path=None):
         of each game in the week from 
         https://www.pro-football-reference.com/years/'year'/games.htm. 
     """
-    if local_path:
-        soup = get_local_soup(local_path)
-    else:
-        page = get_upcoming_games_page(year)
-        soup = BeautifulSoup(page.content, "html.parser")
-
+    soup = get_soup(year, local_path)
     table = get_table_body(soup)
     rows = get_table_rows(table)
     week = get_week(rows, week_num)
@@ -0,0 +1,376 @@
+"""
+This module estimates playoff, division and seed probabilities by simulating
+the rest of the season many times from the current Teams.elo ratings.
+
+All simulated seasons are played at once: each week's games are drawn for
+every simulation together and the ratings are updated after every game the
+same way elo_model.play_week moves them after a real result. A simulated
+game only decides the winner, so its margin of victory is drawn from the
+winning margins of the games already in the database. Results are cached per week in the
+PlayoffOdds table (see migrations) so that the website only has to read them.
+"""
+
+import os
+import threading
+import numpy as np
+import elo_model
+import registry
+import scraper
+
+# team tickers by conference and division
+DIVISIONS = {
+    "AFC": [["BUF", "MIA", "NE", "NYJ"],
+            ["BAL", "CIN", "CLE", "PIT"],
+            ["HOU", "IND", "JAC", "TEN"],
+            ["DEN", "KC", "LV", "LAC"]],
+    "NFC": [["DAL", "NYG", "PHI", "WAS"],
+            ["CHI", "DET", "GB", "MIN"],
+            ["ATL", "CAR", "NO", "TB"],
+            ["ARI", "LAR", "SF", "SEA"]],
+}
+PLAYOFF_SEEDS = 7
+REGULAR_SEASON_WEEKS = 18
+# simulations held in memory at once by a worker
+BLOCK_SIZE = 10000
+# margins of victory drawn from while the database has no decided game,
+# the most common NFL margins
+DEFAULT_MARGINS = np.array([3, 7, 10, 14], dtype=np.int64)
+
+# only one request at a time may simulate a week, see `get_odds`
+_run_lock = threading.Lock()
+
+def remaining_schedule(week, season, local_path=None):
+    """
+    Get the games that have not been played yet this season.
+
+    Parameters
+    ----------
+    week : int
+        First week that has not been played.
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+    local_path : str
+        Local path to an html file for debugging.
+
+    Returns
+    -------
+    list[tuple[int, str, str]]
+        (week, home team name, away team name) of each game.
+    """
+    soup = scraper.get_soup(season, local_path)
+    rows = scraper.get_table_rows(scraper.get_table_body(soup))
+
+    schedule = []
+    for week_num in range(week, REGULAR_SEASON_WEEKS+1):
+        for game in scraper.get_games(scraper.get_week(rows, week_num)):
+            if game["game_location"] in ('@', 'N'):
+                schedule.append((week_num, game["loser"], game["winner"]))
+            else:
+                schedule.append((week_num, game["winner"], game["loser"]))
+    return schedule
+
+def current_wins(cur, season, team_index):
+    """
+    Count the regular season wins of each team so far this season.
+    Ties count as half a win.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+    team_index : dict[str: int]
+        Team name to team index.
+
+    Returns
+    -------
+    np.ndarray
+        Wins of each team.
+    """
+    season_name = str(season) + "-" + str(season+1)
+    games = cur.execute("""SELECT Games.home_team, Games.away_team,
+                        Games.home_points, Games.away_points
+                        FROM Games
+                        WHERE Games.season_id = (SELECT id FROM Seasons WHERE season = ?)
+                        and Games.playoffs = 0""",
+                        (season_name,)).fetchall()
+
+    wins = np.zeros(len(team_index))
+    for home_team, away_team, home_points, away_points in games:
+        home_points, away_points = int(home_points), int(away_points)
+        if home_points == away_points:
+            wins[team_index[home_team]] += 0.5
+            wins[team_index[away_team]] += 0.5
+        elif home_points > away_points:
+            wins[team_index[home_team]] += 1
+        else:
+            wins[team_index[away_team]] += 1
+    return wins
+
+def seed_teams(wins, conferences, rng):
+    """
+    Assign playoff seeds in every simulation. Division winners get seeds 1-4
+    and the three best other teams in the conference get the wild cards.
+    Ties in wins are broken at random rather than with the NFL tiebreakers.
+
+    Parameters
+    ----------
+    wins : np.ndarray
+        (n_sims, n_teams) wins of each team in each simulation.
+    conferences : list[np.ndarray]
+        (4, 4) array of team indexes per division for each conference.
+    rng : np.random.Generator
+
+    Returns
+    -------
+    np.ndarray
+        (n_sims, n_teams) seed of each team, 0 if it missed the playoffs.
+    """
+    n_sims = wins.shape[0]
+    seeds = np.zeros(wins.shape, dtype=np.int8)
+    sims = np.arange(n_sims)[:, np.newaxis]
+    # wins are multiples of 0.5 so the noise only reorders teams that are tied
+    score = wins + rng.random(wins.shape)*0.1
+
+    for divisions in conferences:
+        division_scores = score[:, divisions]
+        winner_pos = division_scores.argmax(axis=2)
+        winners = divisions[np.arange(len(divisions)), winner_pos]
+        winner_scores = np.take_along_axis(division_scores, winner_pos[..., np.newaxis], 2)[..., 0]
+        ranked = np.take_along_axis(winners, np.argsort(-winner_scores, axis=1), 1)
+        seeds[sims, ranked] = np.arange(1, len(divisions)+1)
+
+        teams = divisions.ravel()
+        wild_card_scores = np.where(seeds[:, teams] > 0, -np.inf, score[:, teams])
+        n_wild_cards = PLAYOFF_SEEDS - len(divisions)
+        wild_cards = teams[np.argsort(-wild_card_scores, axis=1)[:, :n_wild_cards]]
+        seeds[sims, wild_cards] = np.arange(len(divisions)+1, PLAYOFF_SEEDS+1)
+
+    return seeds
+
+def winning_margins(cur):
+    """
+    Winning margin of every game in the database that was not a tie.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+
+    Returns
+    -------
+    np.ndarray
+        Positive margin of each game.
+    """
+    margins = cur.execute("""SELECT abs(home_points - away_points) FROM Games
+                          WHERE home_points != away_points""").fetchall()
+    return np.array([margin[0] for margin in margins], dtype=np.int64)
+
+def simulate_chunk(elo, wins, schedule, conferences, margins, n_sims, seed):
+    """
+    Simulate the rest of the season `n_sims` times.
+
+    Parameters
+    ----------
+    elo : np.ndarray
+        Current rating of each team.
+    wins : np.ndarray
+        Current wins of each team.
+    schedule : dict[str: np.ndarray]
+        {"week", "home_idx", "away_idx", "pregame_shift"} of each remaining game.
+    conferences : list[np.ndarray]
+        See `seed_teams`.
+    margins : np.ndarray
+        Winning margins the margin of each simulated game is drawn from,
+        see `winning_margins`. DEFAULT_MARGINS are used if it is empty.
+    n_sims : int
+        Number of seasons to simulate.
+    seed : np.random.SeedSequence or int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    dict[str: np.ndarray]
+        Totals over the simulations of each team's "wins", "division"
+        titles and times finishing with each seed ("seeds", n_teams x 7).
+    """
+    rng = np.random.default_rng(seed)
+    if len(margins) == 0:
+        margins = DEFAULT_MARGINS
+    n_teams = len(elo)
+    totals = {
+        "wins": np.zeros(n_teams),
+        "division": np.zeros(n_teams),
+        "seeds": np.zeros((n_teams, PLAYOFF_SEEDS)),
+    }
+    weeks = [np.flatnonzero(schedule["week"] == week) for week in np.unique(schedule["week"])]
+
+    for block_start in range(0, n_sims, BLOCK_SIZE):
+        block_sims = min(BLOCK_SIZE, n_sims - block_start)
+        ratings = np.tile(np.asarray(elo, dtype=np.float64), (block_sims, 1))
+        sim_wins = np.tile(np.asarray(wins, dtype=np.float64), (block_sims, 1))
+
+        # outcome of every remaining game in every simulation, True for a home win
+        draws = rng.random((block_sims, len(schedule["week"])))
+        outcomes = np.empty(draws.shape, dtype=bool)
+
+        # a team plays at most once a week so a week's games can be updated together,
+        # as in elo_model.play_week
+        for games in weeks:
+            home, away = schedule["home_idx"][games], schedule["away_idx"][games]
+            home_pregame_elo = ratings[:, home] + schedule["pregame_shift"][games]
+            away_pregame_elo = ratings[:, away] - schedule["pregame_shift"][games]
+            home_win_prob = elo_model.win_prob(home_pregame_elo - away_pregame_elo)
+            outcomes[:, games] = draws[:, games] < home_win_prob
+
+            margin = rng.choice(margins, size=(block_sims, len(games)))
+            point_diff = np.where(outcomes[:, games], margin, -margin)
+            elo_shift = elo_model.postgame_elo_shift_batch(home_pregame_elo, away_pregame_elo,
+                                                           point_diff, 0, False)
+            ratings[:, home] = home_pregame_elo + elo_shift
+            ratings[:, away] = away_pregame_elo - elo_shift
+            sim_wins[:, home] += outcomes[:, games]
+            sim_wins[:, away] += ~outcomes[:, games]
+
+        seeds = seed_teams(sim_wins, conferences, rng)
+        totals["wins"] += sim_wins.sum(axis=0)
+        totals["division"] += ((seeds >= 1) & (seeds <= len(conferences[0]))).sum(axis=0)
+        for seed_num in range(1, PLAYOFF_SEEDS+1):
+            totals["seeds"][:, seed_num-1] += (seeds == seed_num).sum(axis=0)
+
+    return totals
+
+def simulate(elo, wins, schedule, conferences, margins, n_sims, seed=None, workers=None):
+    """
+    Simulate the rest of the season `n_sims` times split across worker processes.
+
+    Parameters
+    ----------
+    elo, wins, schedule, conferences, margins :
+        See `simulate_chunk`.
+    n_sims : int
+        Number of seasons to simulate.
+    seed : int
+        Seed of the random number generator. Default is None.
+    workers : int
+        Number of worker processes. Default is None which uses every core.
+
+    Returns
+    -------
+    dict[str: np.ndarray]
+        Per team "wins" (mean), "division" and "playoffs" probabilities and
+        "seeds" (n_teams x 7) probability of finishing with each seed.
+    """
+    workers = min(workers or os.cpu_count(), max(1, n_sims // BLOCK_SIZE))
+    chunk_sims = [n_sims // workers + (idx < n_sims % workers) for idx in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+
+    if workers == 1:
+        chunks = [simulate_chunk(elo, wins, schedule, conferences, margins, n_sims, seeds[0])]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(simulate_chunk, elo, wins, schedule, conferences,
+                                       margins, sims, chunk_seed)
+                       for sims, chunk_seed in zip(chunk_sims, seeds)]
+            chunks = [future.result() for future in futures]
+
+    odds = {name: sum(chunk[name] for chunk in chunks)/n_sims for name in chunks[0]}
+    odds["playoffs"] = odds["seeds"].sum(axis=1)
+    return odds
+
+def run(cur, conn, week, season, n_sims=100000, local_path=None, workers=None):
+    """
+    Simulate the rest of the season from the current ratings and cache
+    the results in the PlayoffOdds table.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+    conn : sqlite connection object
+    week : int
+        First week that has not been played.
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+    n_sims : int
+        Number of seasons to simulate.
+    local_path : str
+        Local path to an html file for debugging.
+    workers : int
+        Number of worker processes, see `simulate`. Default is None which
+        uses every core.
+
+    NOTE: Only the writes of the results are committed, the simulation runs
+    outside of any transaction.
+    """
+    teams = cur.execute("SELECT id, name, ticker, elo FROM Teams ORDER BY id").fetchall()
+    team_index = {team[1]: idx for idx, team in enumerate(teams)}
+    ticker_index = {team[2]: idx for idx, team in enumerate(teams)}
+    elo = np.array([team[3] for team in teams], dtype=np.float64)
+    conferences = [np.array([[ticker_index[ticker] for ticker in division] for division in divisions])
+                   for divisions in DIVISIONS.values()]
+
+    lookups = registry.get(cur)
+    travel_table = lookups["travel_table"]
+    games = remaining_schedule(week, season, local_path)
+    home_idx = np.array([team_index[game[1]] for game in games], dtype=np.int64)
+    away_idx = np.array([team_index[game[2]] for game in games], dtype=np.int64)
+    schedule = {
+        "week": np.array([game[0] for game in games], dtype=np.int64),
+        "home_idx": home_idx,
+        "away_idx": away_idx,
+        "pregame_shift": elo_model.pregame_elo_shift_batch(home_idx, away_idx,
+                                                           np.full(len(games), -1), travel_table),
+    }
+
+    odds = simulate(elo, current_wins(cur, season, team_index), schedule,
+                    conferences, winning_margins(cur), n_sims, workers=workers)
+
+    season_name = str(season) + "-" + str(season+1)
+    season_id = lookups["season_ids"][season_name]
+    with conn:
+        cur.executemany(f"""INSERT OR REPLACE INTO PlayoffOdds VALUES
+                        (?, ?, ?, ?, ?, ?, ?{", ?"*PLAYOFF_SEEDS})""",
+                        [(season_id, week, team[0], n_sims, odds["wins"][idx], odds["division"][idx],
+                          odds["playoffs"][idx], *odds["seeds"][idx].tolist())
+                         for idx, team in enumerate(teams)])
+
+def get_odds(cur, conn, week, season, local_path=None):
+    """
+    Get the cached odds for a week, simulating the season first if
+    they have not been calculated yet. The simulation is split across
+    every core and only one request simulates at a time, the others wait
+    for its results.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+    conn : sqlite connection object
+    week : int
+        First week that has not been played.
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+    local_path : str
+        Local path to an html file for debugging.
+
+    Returns
+    -------
+    list[dict]
+        e.g. {"team": "Chicago Bears", "wins": 7.2, "division": 0.08,
+        "playoffs": 0.21, "seeds": [0.01, 0.02, 0.02, 0.03, 0.04, 0.04, 0.05]}
+    """
+    season_name = str(season) + "-" + str(season+1)
+    query = """SELECT Teams.name, PlayoffOdds.*
+            FROM PlayoffOdds JOIN Seasons JOIN Teams
+            on PlayoffOdds.season_id = Seasons.id and PlayoffOdds.team_id = Teams.id
+            WHERE Seasons.season = ? and PlayoffOdds.week = ?"""
+    rows = cur.execute(query, (season_name, week)).fetchall()
+    if not rows:
+        with _run_lock:
+            # another request may have simulated the week while this one waited
+            rows = cur.execute(query, (season_name, week)).fetchall()
+            if not rows:
+                run(cur, conn, week, season, local_path=local_path)
+                rows = cur.execute(query, (season_name, week)).fetchall()
+
+    return [{"team": row[0], "wins": row[5], "division": row[6],
+             "playoffs": row[7], "seeds": list(row[8:])} for row in rows]
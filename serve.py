@@ -0,0 +1,103 @@
+"""
+Lean entry point of the website for instances that serve an already built
+database.
+
+`main` only imports what its routes need at startup; the batch modules
+(see pipeline) are imported by `main.setup` and the scraping modules by
+the routes that ingest games, the first time they are called. Run this
+file instead of main.py to start the app without rebuilding any tables,
+or point a WSGI server at `serve:app`.
+
+    python serve.py --import-report --budget 0.5
+
+prints what importing main costs per module in a fresh interpreter and
+exits with an error when the imports take longer than the budget or pull
+in one of HEAVY_MODULES, as a check that startup stays lean.
+"""
+
+import argparse
+import subprocess
+import sys
+import db
+from main import app
+
+# modules that have no business being imported when the app starts
+HEAVY_MODULES = ["torch", "pandas", "pipeline", "init_db", "elo_sim", "features",
+                 "process_inference_data", "process_train_test_data",
+                 "upcoming_games", "season_sim", "scraper", "bs4", "requests"]
+
+def import_report(module="main"):
+    """
+    Import time of every module imported by `module`, measured with
+    python -X importtime in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : str
+        Module to import.
+
+    Returns
+    -------
+    list[tuple[str, float, float]]
+        (module, seconds spent in the module itself, seconds including the
+        modules it imported) in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    report = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        report.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return report
+
+def check(report, module="main", budget=None):
+    """
+    Problems with the startup imports of `module`.
+
+    Parameters
+    ----------
+    report : list[tuple[str, float, float]]
+        From `import_report`.
+    module : str
+        The module the report was made for.
+    budget : float
+        Seconds importing `module` may take. Default is None which
+        sets no limit.
+
+    Returns
+    -------
+    list[str]
+        Empty if there are none.
+    """
+    problems = [f"{name} is imported at startup" for name, _, _ in report if name in HEAVY_MODULES]
+    total = next((cumulative for name, _, cumulative in report if name == module), 0.0)
+    if budget is not None and total > budget:
+        problems.append(f"importing {module} took {total:.3f}s, over the {budget:.3f}s budget")
+    return problems
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the website from an already built database.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--import-report", action="store_true",
+                        help="print the import time of each module main imports and exit")
+    parser.add_argument("--top", type=int, default=20,
+                        help="number of modules in the import report, slowest first")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="fail the import report if importing main takes longer, in seconds")
+    args = parser.parse_args()
+
+    if args.import_report:
+        report = import_report("main")
+        print(f"{'module':<40}{'self':>10}{'cumulative':>12}")
+        for name, own, cumulative in sorted(report, key=lambda row: -row[2])[:args.top]:
+            print(f"{name:<40}{own:>9.3f}s{cumulative:>11.3f}s")
+        problems = check(report, "main", args.budget)
+        for problem in problems:
+            print(problem)
+        sys.exit(1 if problems else 0)
+
+    app.run(host=args.host, port=args.port)
+    db.close()
@@ -0,0 +1,115 @@
+"""
+Shared setup of the tests. The modules live at the top of the repository,
+so it is put on the import path.
+
+`conn` is a database with a small made up game history for the tests that
+compare a vectorized step with the loop it replaced.
+"""
+
+import os
+import sqlite3
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import elo_sim
+import migrations
+import registry
+
+N_TEAMS = 6
+# season, number of regular season weeks
+SEASONS = [("2010-2011", 17), ("2011-2012", 17), ("2012-2013", 18)]
+
+def week_names():
+    """
+    Weeks in the order init_db hands out their ids, week "18" last as it
+    was first played after the playoff weeks existed.
+    """
+    return [str(week) for week in range(1, 18)] + elo_sim.PLAYOFF_WEEKS + ["18"]
+
+def schedule(rng, teams):
+    """
+    (season, week, home team, away team, neutral destination, playoffs) of
+    every game of a small history.
+
+    The first season is played in weeks 1 to 14 only, so that every team
+    has exactly the 14 games that seed the feature windows. The later
+    seasons add the cases the replay has to get right: a team playing
+    twice in a week, a game in a week the season does not have, playoff
+    weeks and a neutral site Super Bowl.
+    """
+    games = []
+    for season, (name, length) in enumerate(SEASONS):
+        weeks = range(1, 15) if season == 0 else range(1, length + 1)
+        for week in weeks:
+            order = rng.permutation(teams)
+            games += [(name, str(week), order[idx], order[idx + 1], 'None', 0)
+                      for idx in range(0, len(order), 2)]
+        if season == 1:
+            games.append((name, "17", teams[0], teams[1], 'None', 0))
+            games.append((name, "18", teams[2], teams[3], 'None', 0))
+        order = rng.permutation(teams)
+        games += [(name, "WildCard", order[0], order[1], 'None', 1),
+                  (name, "WildCard", order[2], order[3], 'None', 1),
+                  (name, "Division", order[0], order[2], 'None', 1),
+                  (name, "Division", order[4], order[5], 'None', 1),
+                  (name, "ConfChamp", order[0], order[4], 'None', 1),
+                  (name, "SuperBowl", order[0], order[5], registry.TEAMS[order[1]][2], 1)]
+    return games
+
+def fill_history(cur, seed=0):
+    """
+    Insert the teams, seasons, weeks and games of a small random history.
+    Each season has a tie.
+    """
+    rng = np.random.default_rng(seed)
+    teams = list(registry.TEAMS)[:N_TEAMS]
+    cur.executemany("""INSERT INTO Teams (ticker, name, latitude, longitude, elo)
+                    VALUES (?, ?, ?, ?, ?)""",
+                    [(registry.TEAMS[name][2], name, *registry.TEAMS[name][:2], 1505)
+                     for name in teams])
+    cur.executemany("INSERT INTO Seasons (id, season, length) VALUES (?, ?, ?)",
+                    [(season_id, *season) for season_id, season in enumerate(SEASONS, start=1)])
+    cur.executemany("INSERT INTO Weeks (id, week) VALUES (?, ?)",
+                    list(enumerate(week_names(), start=1)))
+    season_ids = {name: season_id for season_id, (name, _) in enumerate(SEASONS, start=1)}
+    week_ids = {week: week_id for week_id, week in enumerate(week_names(), start=1)}
+    team_ids = dict(cur.execute("SELECT name, id FROM Teams").fetchall())
+
+    rows = []
+    tied = set()
+    for season, week, home, away, neutral, playoffs in schedule(rng, teams):
+        home_points, away_points = rng.integers(0, 45, 2).tolist()
+        if season not in tied and not playoffs:
+            away_points = home_points
+            tied.add(season)
+        rows.append((season_ids[season], week_ids[week], home, away, home_points, away_points,
+                     *rng.integers(150, 500, 2).tolist(), *rng.integers(0, 5, 2).tolist(),
+                     0, 0, playoffs, 0, 0, neutral, team_ids[home], team_ids[away]))
+    cur.executemany("""INSERT INTO Games
+                    (season_id, week_id, home_team, away_team,
+                    home_points, away_points, home_yards,
+                    away_yards, home_turnovers, away_turnovers,
+                    home_pregame_elo, away_pregame_elo, playoffs,
+                    home_bye, away_bye, neutral_destination,
+                    home_team_id, away_team_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """
+    Connection to a db.sqlite holding the history of `fill_history`, in a
+    temporary directory that is also the working directory, where the
+    modules that open db.sqlite and game_cache look for them.
+    """
+    monkeypatch.chdir(tmp_path)
+    registry.invalidate()
+    conn = sqlite3.connect("db.sqlite")
+    migrations.migrate(conn)
+    fill_history(conn.cursor())
+    conn.commit()
+    yield conn
+    conn.close()
+    registry.invalidate()
@@ -0,0 +1,33 @@
+"""
+The connections of the web app open the database DB_PATH names when
+they are opened, not the one it named on import.
+"""
+
+import sqlite3
+import threading
+import db
+
+def test_connections_follow_db_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "other.sqlite")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    writer = db.connect()
+    writer.execute("CREATE TABLE Marker (id INTEGER)")
+    writer.commit()
+
+    # a new thread opens its own connections
+    tables = []
+    def read():
+        tables.extend(db.reader().execute("SELECT name FROM sqlite_master").fetchall())
+        db.reader().close()
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+
+    assert tables == [("Marker",)]
+    writer.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT name FROM sqlite_master").fetchall() == [("Marker",)]
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    conn.close()
+    assert not (tmp_path / "db.sqlite").exists()
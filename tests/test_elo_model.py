@@ -0,0 +1,62 @@
+"""
+The batch Elo functions against their scalar versions, one game at a time.
+"""
+
+import numpy as np
+import pytest
+import elo_model
+import registry
+
+@pytest.fixture
+def games():
+    rng = np.random.default_rng(0)
+    n_games = 500
+    home_points = rng.integers(0, 50, n_games)
+    away_points = rng.integers(0, 50, n_games)
+    # plenty of ties
+    away_points[::10] = home_points[::10]
+    return {
+        "home_pregame_elo": rng.integers(1200, 1800, n_games).astype(np.float64),
+        "away_pregame_elo": rng.integers(1200, 1800, n_games).astype(np.float64),
+        "home_points": home_points,
+        "away_points": away_points,
+        "playoffs": rng.random(n_games) < 0.2,
+    }
+
+def test_postgame_elo_shift_batch(games):
+    expected = [elo_model.postgame_elo_shift({key: values[idx] for key, values in games.items()}, None)
+                for idx in range(len(games["playoffs"]))]
+    shift = elo_model.postgame_elo_shift_batch(games["home_pregame_elo"], games["away_pregame_elo"],
+                                               games["home_points"], games["away_points"],
+                                               games["playoffs"])
+    assert shift.tolist() == expected
+
+def test_postgame_elo_shift_batch_constants(games):
+    params = {"k": 25, "mov_constant": 2.0, "mov_elo_scale": 0.002}
+    expected = [elo_model.postgame_elo_shift({key: values[idx] for key, values in games.items()},
+                                             None, **params)
+                for idx in range(len(games["playoffs"]))]
+    shift = elo_model.postgame_elo_shift_batch(games["home_pregame_elo"], games["away_pregame_elo"],
+                                               games["home_points"], games["away_points"],
+                                               games["playoffs"], **params)
+    assert shift.tolist() == expected
+
+def test_pre_season_elo_batch():
+    # 1507.25 and 1508.75 regress to 1506.5 and 1507.5, which both round half to even
+    elo = np.array([1200, 1505, 1507.25, 1508.75, 1800, 1650.5])
+    assert elo_model.pre_season_elo_batch(elo).tolist() == [elo_model.pre_season_elo(value) for value in elo]
+
+def test_pregame_elo_shift_batch(conn):
+    travel_table = registry.get(conn.cursor())["travel_table"]
+    teams = list(travel_table["team_index"])
+    tickers = list(travel_table["ticker_index"])
+    pairs = [(home, away, dest) for home in range(len(teams)) for away in range(len(teams))
+             if home != away for dest in [-1, 0, len(teams) - 1]]
+    home_idx, away_idx, dest_idx = np.array(pairs).T
+
+    expected = [elo_model.pregame_elo_shift({"home_team": teams[home], "away_team": teams[away],
+                                             "neutral_dest": tickers[dest] if dest >= 0 else 'None'},
+                                            travel_table)
+                for home, away, dest in pairs]
+    shift = elo_model.pregame_elo_shift_batch(home_idx, away_idx, dest_idx, travel_table)
+    assert shift.tolist() == expected
@@ -0,0 +1,171 @@
+"""
+The in-memory Elo replay of elo_sim against the per-game database loop
+it replaced, and its shortcuts against a full replay.
+"""
+
+import numpy as np
+import pytest
+import elo_sim
+from elo_model import get_distance, play_week, postgame_elo_shift, pre_season_elo
+
+def loop_pregame_elo_shift(game_dict, cur):
+    """
+    The pregame elo shift as it was computed before the travel table,
+    with the team locations read from the database for every game.
+    """
+    home_team = cur.execute("SELECT latitude, longitude FROM Teams WHERE name = ? ",
+                            (game_dict["home_team"],)).fetchall()[0]
+    away_team = cur.execute("SELECT latitude, longitude FROM Teams WHERE name = ? ",
+                            (game_dict["away_team"],)).fetchall()[0]
+
+    elo_shift = 0
+    if game_dict["neutral_dest"] != 'None':
+        neutral_lat, neutral_long = cur.execute("SELECT latitude, longitude FROM Teams WHERE ticker = ?",
+                                                (game_dict["neutral_dest"],)).fetchall()[0]
+        home_travel_distance = get_distance(home_team[0], home_team[1], neutral_lat, neutral_long)
+        away_travel_distance = get_distance(away_team[0], away_team[1], neutral_lat, neutral_long)
+        elo_shift -= round(home_travel_distance*0.004) + round(away_travel_distance*0.004)
+    else:
+        distance = get_distance(home_team[0], home_team[1], away_team[0], away_team[1])
+        elo_shift += 48/2
+        elo_shift += round(distance*0.004/2)
+    return elo_shift
+
+def loop_run(cur):
+    """
+    elo_sim.run as the loop over the database it was before it replayed
+    from arrays. Returns the pregame elos by game id and the final ratings
+    by team id, and leaves the writes uncommitted.
+    """
+    cur.execute("UPDATE Teams SET elo=1505")
+    seasons = cur.execute("SELECT season FROM Seasons ORDER BY season").fetchall()
+    teams = cur.execute("SELECT * FROM Teams").fetchall()
+
+    for (season,) in seasons:
+        for team in teams:
+            cur.execute("UPDATE Teams SET elo = ? WHERE id = ?", (pre_season_elo(team[5]), team[0]))
+
+        season_len = cur.execute("SELECT length FROM Seasons WHERE season = ? ", (season,)).fetchone()[0]
+        weeks = list(range(1, season_len+1)) + ["WildCard", "Division", "ConfChamp", "SuperBowl"]
+        for week in weeks:
+            games = cur.execute("""SELECT Games.home_team, Games.away_team,
+                                Games.home_points, Games.away_points, Games.playoffs,
+                                Games.neutral_destination, Games.id
+                                FROM Games JOIN Weeks JOIN Seasons
+                                on Games.week_id = Weeks.id and Games.season_id = Seasons.id
+                                WHERE Weeks.week = ? and Seasons.season = ?
+                                ORDER BY Games.id""", (str(week), season)).fetchall()
+            for game in games:
+                game_dict = {
+                    "home_team": game[0],
+                    "away_team": game[1],
+                    "home_points": game[2],
+                    "away_points": game[3],
+                    "playoffs": game[4],
+                    "neutral_dest": game[5],
+                }
+                pre_elo_shift = loop_pregame_elo_shift(game_dict, cur)
+                home_team_elo = cur.execute("SELECT elo FROM Teams WHERE name = ?", (game[0],)).fetchone()[0]
+                away_team_elo = cur.execute("SELECT elo FROM Teams WHERE name = ?", (game[1],)).fetchone()[0]
+                game_dict["home_pregame_elo"] = home_team_elo + pre_elo_shift
+                game_dict["away_pregame_elo"] = away_team_elo - pre_elo_shift
+
+                post_elo_shift = postgame_elo_shift(game_dict, cur)
+                cur.execute("UPDATE Games SET home_pregame_elo = ?, away_pregame_elo = ? WHERE id = ?",
+                            (game_dict["home_pregame_elo"], game_dict["away_pregame_elo"], game[6]))
+                cur.execute("UPDATE Teams SET elo = ? WHERE name = ?",
+                            (game_dict["home_pregame_elo"] + post_elo_shift, game[0]))
+                cur.execute("UPDATE Teams SET elo = ? WHERE name = ?",
+                            (game_dict["away_pregame_elo"] - post_elo_shift, game[1]))
+
+    return ratings(cur)
+
+def ratings(cur):
+    """
+    Pregame elos by game id and ratings by team id in the database.
+    """
+    pregame = {game_id: (home, away) for game_id, home, away in cur.execute(
+        "SELECT id, home_pregame_elo, away_pregame_elo FROM Games")}
+    return pregame, dict(cur.execute("SELECT id, elo FROM Teams").fetchall())
+
+def test_run_matches_loop(conn):
+    expected = loop_run(conn.cursor())
+    conn.rollback()
+
+    elo_sim.run()
+    assert ratings(conn.cursor()) == expected
+
+def test_replay_skips_weeks_outside_the_schedule(conn):
+    history = elo_sim.load_history(conn.cursor())
+    scheduled = conn.execute("""SELECT count(*) FROM Games JOIN Weeks JOIN Seasons
+                             on Games.week_id = Weeks.id and Games.season_id = Seasons.id
+                             WHERE Weeks.week != '18' or Seasons.length = 18""").fetchone()[0]
+    assert len(history["game_id"]) == scheduled
+    assert np.all(np.diff(history["season_idx"]) >= 0)
+
+def elo_tables(cur):
+    """
+    Everything elo_sim writes except the checkpoints.
+    """
+    history = cur.execute("SELECT * FROM EloHistory ORDER BY team_id, season_id, week_id").fetchall()
+    return ratings(cur), history
+
+def test_update_matches_full_run(conn):
+    elo_sim.run()
+    game_id = conn.execute("""SELECT id FROM Games WHERE season_id = 3 and week_id = 5
+                           ORDER BY id LIMIT 1""").fetchone()[0]
+    conn.execute("UPDATE Games SET home_points = home_points + 17 WHERE id = ?", (game_id,))
+    conn.commit()
+
+    cur = conn.cursor()
+    before = elo_tables(cur)
+    history = elo_sim.load_history(cur)
+    changed = int(np.flatnonzero(history["game_id"] == game_id)[0])
+    start, _ = elo_sim.load_checkpoint(cur, history, changed)
+    assert 0 < start <= changed
+
+    elo_sim.update([game_id])
+    updated = elo_tables(cur)
+    assert updated != before
+    elo_sim.run()
+    assert elo_tables(cur) == updated
+
+def test_replay_by_week_matches_game_by_game(conn):
+    history = elo_sim.load_history(conn.cursor())
+    # the test history has a week where a team plays twice, which play_week must not get
+    teams = np.stack((history["home_idx"], history["away_idx"]), axis=1)
+    weeks = np.split(teams, elo_sim.week_starts(history)[1:])
+    assert any(len(np.unique(week)) < week.size for week in weeks)
+
+    by_week = elo_sim.replay(history, by_week=True)
+    by_game = elo_sim.replay(history, by_week=False)
+    for weekly, single in zip(by_week[:3], by_game[:3]):
+        np.testing.assert_array_equal(weekly, single)
+    assert [idx for idx, _ in by_week[3]] == [idx for idx, _ in by_game[3]]
+    for (_, weekly), (_, single) in zip(by_week[3], by_game[3]):
+        np.testing.assert_array_equal(weekly, single)
+
+def test_play_week_rejects_a_team_playing_twice():
+    elo = np.full(4, 1505.0)
+    with pytest.raises(ValueError):
+        play_week(elo, np.array([0, 1]), np.array([2, 0]), np.zeros(2),
+                  np.array([21, 14]), np.array([7, 10]), np.zeros(2, dtype=bool))
+
+def test_update_from_given_ratings_matches_checkpoint(conn):
+    elo_sim.run()
+    cur = conn.cursor()
+    history = elo_sim.load_history(cur)
+    start = int(elo_sim.week_starts(history)[-8])
+    game_id = int(history["game_id"][start])
+    _, elo = elo_sim.load_checkpoint(cur, history, start)
+    conn.execute("UPDATE Games SET away_points = away_points + 10 WHERE id = ?", (game_id,))
+    conn.commit()
+
+    elo_sim.update_games(cur, [game_id], elo)
+    given = elo_tables(cur)
+    conn.rollback()
+    elo_sim.update([game_id])
+    assert elo_tables(cur) == given
+
+    with pytest.raises(ValueError):
+        elo_sim.update_games(cur, [int(history["game_id"][start + 1])], elo)
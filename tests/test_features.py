@@ -0,0 +1,101 @@
+"""
+The feature windows built with whole-array operations, for MLData and
+InferenceData in one pass, against the per-game loops that used to build
+each table.
+"""
+
+import pytest
+import elo_sim
+import feature_codec
+import features
+
+GAME_COLUMNS = """Games.home_team, Games.away_team, Games.home_points, Games.away_points,
+               Games.home_yards, Games.away_yards, Games.home_turnovers, Games.away_turnovers,
+               Games.home_pregame_elo, Games.away_pregame_elo, Weeks.week, Games.id"""
+
+def game_stats(game, home):
+    """
+    Stats of a game row of GAME_COLUMNS from one team's point of view, in
+    the order of feature_codec.STATS.
+    """
+    (_, _, home_points, away_points, home_yards, away_yards,
+     home_turnovers, away_turnovers, home_elo, away_elo) = game[:10]
+    if home:
+        return [home_elo, away_elo, home_points, away_points,
+                home_yards, away_yards, away_turnovers, home_turnovers]
+    return [away_elo, home_elo, away_points, home_points,
+            away_yards, home_yards, home_turnovers, away_turnovers]
+
+def loop_rows(cur, where):
+    """
+    The rows of a feature table as the old loop built them: each team's
+    window is seeded with its first season games in weeks 1 to 15, then
+    the games matching `where` are stored and pushed in Games.id order.
+
+    Returns
+    -------
+    list[tuple]
+        (game_id, home_pregame_elo, away_pregame_elo, week, windows as
+        nested lists with the shape feature_codec.SHAPE)
+    """
+    teams = [team for (team,) in cur.execute("SELECT name FROM Teams ORDER BY id")]
+    last_games = {}
+    for team in teams:
+        # once a team played a seed game at home, its later seed games are
+        # all stored from the home team's point of view
+        home_team, away_team = False, False
+        last_games[team] = []
+        seed = cur.execute(f"""SELECT {GAME_COLUMNS}
+                           FROM Games JOIN Weeks JOIN Seasons
+                           on Games.week_id = Weeks.id and Games.season_id = Seasons.id
+                           WHERE Weeks.id < 16 and (Games.home_team = ? or Games.away_team = ?)
+                           and Seasons.id = 1 ORDER BY Games.id""", (team, team)).fetchall()
+        for game in seed:
+            if game[0] == team:
+                home_team = True
+            elif game[1] == team:
+                away_team = True
+            last_games[team].append(game_stats(game, home_team))
+        assert len(last_games[team]) == feature_codec.WINDOW
+
+    rows = []
+    games = cur.execute(f"""SELECT {GAME_COLUMNS}
+                        FROM Games JOIN Weeks JOIN Seasons
+                        on Games.week_id = Weeks.id and Games.season_id = Seasons.id
+                        WHERE {where} ORDER BY Games.id""").fetchall()
+    for game in games:
+        home, away = game[0], game[1]
+        windows = [[list(stat) for stat in zip(*last_games[team])] for team in (home, away)]
+        # the INTEGER week_number column stores the numbered weeks as integers
+        week = int(game[10]) if game[10].isdigit() else game[10]
+        rows.append((game[11], game[8], game[9], week, windows))
+        last_games[home] = last_games[home][1:] + [game_stats(game, True)]
+        last_games[away] = last_games[away][1:] + [game_stats(game, False)]
+    return rows
+
+def built_rows(cur, table):
+    return [(game_id, home_elo, away_elo, week, feature_codec.unpack(windows).tolist())
+            for game_id, home_elo, away_elo, week, windows in cur.execute(
+                f"""SELECT game_id, home_pregame_elo, away_pregame_elo, week_number, windows
+                FROM {table} ORDER BY id""")]
+
+@pytest.mark.parametrize("table, where", [
+    ("MLData", "Weeks.id < 16 and Seasons.id > 1"),
+    ("InferenceData", "Seasons.id > 1"),
+])
+def test_build_matches_loop(conn, table, where):
+    elo_sim.run()
+    cur = conn.cursor()
+    features.build(cur, ["MLData", "InferenceData"])
+
+    expected = loop_rows(cur, where)
+    assert len(expected) > 0
+    assert built_rows(cur, table) == expected
+
+def test_build_one_table_matches_both(conn):
+    elo_sim.run()
+    cur = conn.cursor()
+    features.build(cur, ["MLData", "InferenceData"])
+    both = built_rows(cur, "MLData")
+    features.build(cur, ["MLData"])
+    assert built_rows(cur, "MLData") == both
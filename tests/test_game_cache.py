@@ -0,0 +1,31 @@
+"""
+The cache of the Games table only holds committed games.
+"""
+
+import game_cache
+
+def add_game(conn, home_points):
+    conn.execute("""INSERT INTO Games (season_id, week_id, home_team, away_team, home_points, away_points,
+                 home_yards, away_yards, home_turnovers, away_turnovers, home_pregame_elo,
+                 away_pregame_elo, playoffs, home_bye, away_bye, neutral_destination,
+                 home_team_id, away_team_id)
+                 SELECT season_id, 17, home_team, away_team, ?, away_points, home_yards, away_yards,
+                 home_turnovers, away_turnovers, home_pregame_elo, away_pregame_elo, playoffs,
+                 home_bye, away_bye, neutral_destination, home_team_id, away_team_id
+                 FROM Games WHERE season_id = 1 ORDER BY id LIMIT 1""", (home_points,))
+
+def test_rolled_back_games_are_not_cached(conn):
+    cur = conn.cursor()
+    n_games = conn.execute("SELECT count(*) FROM Games").fetchone()[0]
+
+    add_game(conn, 99)
+    # the transaction sees its own game, the cache does not
+    assert game_cache.load(cur, ["home_points"])["home_points"][-1] == 99
+    assert game_cache.read_manifest()["n_games"] == n_games
+    conn.rollback()
+
+    # the same version of the table, with a different game
+    add_game(conn, 98)
+    conn.commit()
+    points = game_cache.load(cur, ["home_points"])["home_points"]
+    assert len(points) == n_games + 1 and points[-1] == 98
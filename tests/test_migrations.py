@@ -0,0 +1,29 @@
+"""
+Migrations that change the data already in a database.
+"""
+
+import sqlite3
+import pytest
+import migrations
+
+GAME_COLUMNS = """season_id, week_id, home_team, away_team, home_points, away_points,
+               home_yards, away_yards, home_turnovers, away_turnovers,
+               home_pregame_elo, away_pregame_elo, playoffs, home_bye, away_bye,
+               neutral_destination, home_team_id, away_team_id"""
+
+def test_games_unique_key_drops_reingested_weeks(conn):
+    version = migrations.MIGRATIONS.index(migrations.add_games_unique_key) + 1
+    conn.execute("DROP INDEX idx_games_unique")
+    conn.execute("DELETE FROM SchemaVersion WHERE version = ?", (version,))
+    games = conn.execute("SELECT * FROM Games ORDER BY id").fetchall()
+    # a week ingested twice, as a restart of the web process used to do
+    conn.execute(f"""INSERT INTO Games ({GAME_COLUMNS})
+                 SELECT {GAME_COLUMNS} FROM Games WHERE season_id = 3 and week_id = 2""")
+    conn.commit()
+    assert len(conn.execute("SELECT * FROM Games").fetchall()) > len(games)
+
+    assert migrations.migrate(conn) == [version]
+    assert conn.execute("SELECT * FROM Games ORDER BY id").fetchall() == games
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(f"""INSERT INTO Games ({GAME_COLUMNS})
+                     SELECT {GAME_COLUMNS} FROM Games WHERE id = 1""")
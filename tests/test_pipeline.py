@@ -0,0 +1,17 @@
+"""
+The stages of pipeline on a database that has games already.
+"""
+
+import os
+import pipeline
+
+def test_games_of_an_unfingerprinted_database_are_kept(conn, monkeypatch):
+    monkeypatch.setattr(pipeline, "DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "data"))
+    # none of the test games are in the data files, like the games of the weekly ingest
+    games = conn.execute("SELECT * FROM Games ORDER BY id").fetchall()
+    assert conn.execute("SELECT count(*) FROM StageFingerprints").fetchone()[0] == 0
+
+    assert pipeline.run(["games"])[0][:2] == ("games", False)
+    assert conn.execute("SELECT * FROM Games ORDER BY id").fetchall() == games
+    assert pipeline.run(["games"])[0][:2] == ("games", False)
@@ -0,0 +1,24 @@
+"""
+The serving queries must be answered through indexes, so their plans are
+checked against the schema built by the migrations.
+"""
+
+import sqlite3
+import pytest
+import migrations
+import queries
+
+@pytest.fixture
+def cur():
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    yield conn.cursor()
+    conn.close()
+
+@pytest.mark.parametrize("route", list(queries.SERVING_QUERIES))
+def test_serving_query_does_not_scan(cur, route):
+    query, params = queries.SERVING_QUERIES[route]
+    assert queries.full_scans(cur, query, params) == []
+
+def test_full_scans_reports_scans(cur):
+    assert queries.full_scans(cur, "SELECT * FROM Games WHERE home_points = ?", (7,)) == ["SCAN Games"]
@@ -0,0 +1,26 @@
+"""
+The ring buffer of the weekly ingest against windows kept in lists.
+"""
+
+import numpy as np
+import feature_codec
+import rolling_stats
+
+def test_rolling_team_stats_matches_lists():
+    rng = np.random.default_rng(0)
+    n_teams, window = 3, feature_codec.WINDOW
+    stats = rolling_stats.RollingTeamStats(n_teams)
+    seeded = rng.integers(-50, 500, (2, len(feature_codec.STATS), 5))
+    stats.load([0, 2], seeded)
+    lists = {0: list(seeded[0].T), 1: [], 2: list(seeded[1].T)}
+
+    for _ in range(40):
+        team = int(rng.integers(n_teams))
+        game = rng.integers(-50, 500, len(feature_codec.STATS))
+        stats.push(team, game)
+        lists[team] = (lists[team] + [game])[-window:]
+
+        expected = np.array(lists[team]).T
+        np.testing.assert_array_equal(stats.games(team), expected)
+        np.testing.assert_array_equal(stats.diffs(team),
+                                      feature_codec.for_against_diffs(expected.astype(feature_codec.DTYPE)))
@@ -0,0 +1,89 @@
+"""
+Seeded runs of the season simulation: the totals every simulated season
+must add up to, and the same seed giving the same odds.
+"""
+
+import numpy as np
+import pytest
+import season_sim
+
+N_TEAMS = 32
+
+def conferences():
+    """
+    The conferences of season_sim.DIVISIONS with the teams numbered in order.
+    """
+    return [np.arange(16).reshape(4, 4), np.arange(16, 32).reshape(4, 4)]
+
+def schedule(rng, n_weeks=3):
+    """
+    Every team plays once in each of `n_weeks` weeks.
+    """
+    weeks, home, away = [], [], []
+    for week in range(n_weeks):
+        order = rng.permutation(N_TEAMS)
+        weeks += [week + 16]*(N_TEAMS // 2)
+        home += order[0::2].tolist()
+        away += order[1::2].tolist()
+    return {
+        "week": np.array(weeks),
+        "home_idx": np.array(home),
+        "away_idx": np.array(away),
+        "pregame_shift": rng.integers(-20, 30, len(weeks)).astype(np.float64),
+    }
+
+def test_seed_teams():
+    rng = np.random.default_rng(0)
+    wins = rng.integers(0, 16, (500, N_TEAMS)) + rng.integers(0, 2, (500, N_TEAMS))*0.5
+    seeds = season_sim.seed_teams(wins, conferences(), rng)
+
+    for divisions in conferences():
+        teams = divisions.ravel()
+        conference_seeds = np.sort(seeds[:, teams], axis=1)
+        assert (conference_seeds[:, -season_sim.PLAYOFF_SEEDS:] == np.arange(1, 8)).all()
+        assert (conference_seeds[:, :-season_sim.PLAYOFF_SEEDS] == 0).all()
+        for sim in range(len(wins)):
+            sim_wins, sim_seeds = wins[sim], seeds[sim]
+            for division in divisions:
+                winner = division[(sim_seeds[division] >= 1) & (sim_seeds[division] <= 4)]
+                assert len(winner) == 1
+                assert sim_wins[winner[0]] == sim_wins[division].max()
+            # seeds are handed out by wins, among the division winners and the other teams
+            for group in (sim_seeds[teams] <= 4, sim_seeds[teams] > 4):
+                group_teams = teams[group & (sim_seeds[teams] > 0)]
+                ordered = group_teams[np.argsort(sim_seeds[group_teams])]
+                assert (np.diff(sim_wins[ordered]) <= 0).all()
+            missed = sim_wins[teams[sim_seeds[teams] == 0]]
+            wild_cards = sim_wins[teams[sim_seeds[teams] > 4]]
+            assert missed.max() <= wild_cards.min()
+
+@pytest.mark.parametrize("margins", [np.array([1, 3, 3, 7, 14, 21]), np.array([], dtype=np.int64)])
+def test_simulate_chunk_totals(margins):
+    rng = np.random.default_rng(1)
+    elo = rng.integers(1300, 1700, N_TEAMS).astype(np.float64)
+    wins = rng.integers(0, 10, N_TEAMS).astype(np.float64)
+    games = schedule(rng)
+    n_sims = 300
+
+    totals = season_sim.simulate_chunk(elo, wins, games, conferences(), margins, n_sims, 7)
+    # a simulated game never ends in a tie
+    assert totals["wins"].sum() == n_sims*(wins.sum() + len(games["week"]))
+    assert totals["division"].sum() == n_sims*8
+    assert (totals["seeds"].sum(axis=0) == n_sims*2).all()
+
+    again = season_sim.simulate_chunk(elo, wins, games, conferences(), margins, n_sims, 7)
+    for name in totals:
+        np.testing.assert_array_equal(again[name], totals[name])
+
+def test_simulate_is_seeded():
+    rng = np.random.default_rng(2)
+    elo = rng.integers(1300, 1700, N_TEAMS).astype(np.float64)
+    wins = rng.integers(0, 10, N_TEAMS).astype(np.float64)
+    games = schedule(rng)
+    args = (elo, wins, games, conferences(), np.array([3, 7]), 2*season_sim.BLOCK_SIZE)
+
+    odds = season_sim.simulate(*args, seed=5, workers=2)
+    again = season_sim.simulate(*args, seed=5, workers=2)
+    for name in odds:
+        np.testing.assert_array_equal(again[name], odds[name])
+    assert odds["playoffs"].sum() == pytest.approx(14)
@@ -1,9 +1,11 @@
 import elo_model
+import elo_sim
 import scraper
 from datetime import date
-import pandas as pd
-import models
-import torch
+import feature_codec
+import registry
+import rolling_stats
+import numpy_models
 import numpy as np
 
 def calc_last_game_date(games):
@@ -26,38 +28,91 @@ def calc_last_game_date(games):
                             int(last_game_date[2]))
     return last_game_date
 
-def add_season_to_db(cur, conn):
+def season_name(season):
     """
-    Update the Seasons table in the database to include
-    the most recent season + 1.
+    Name of a season in the Seasons table, e.g. "2023-2024" for 2023.
+    """
+    return str(season) + "-" + str(season+1)
+
+def add_season_to_db(cur, season):
+    """
+    Add `season` to the Seasons table if it is not in it yet.
+    NOTE: Commit must be made after the function returns.
 
     Parameters
     ----------
     cur : sqlite cursor object
-    conn : sqlite connection object
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+
+    Returns
+    -------
+    bool
+        True if the season was added.
     """
-    last_season = cur.execute("SELECT * FROM Seasons").fetchall()[-1]
-    year = last_season[1].split("-")
-    next_year = year[1] + "-" + str(int(year[1])+1)
     length = 18
     cur.execute("""INSERT OR IGNORE INTO Seasons (season, length)
-                VALUES (?, ?)""", (next_year, length))
-    conn.commit()
+                VALUES (?, ?)""", (season_name(season), length))
+    return cur.rowcount == 1
 
-def update_pre_season_elo(cur, conn):
+def update_pre_season_elo(cur):
     """
     Update the elo score for each team with their preseason elo.
+    NOTE: Commit must be made after the function returns.
 
     Parameters
     ----------
     cur : sqlite cursor object
-    conn : sqlite connection object
     """
     teams = cur.execute("SELECT id, elo FROM Teams").fetchall()
     for team in teams:
         elo = elo_model.pre_season_elo(team[1])
         cur.execute("UPDATE Teams SET elo = ? WHERE id = ?", (elo,team[0]))
-    conn.commit()
+
+def start_season(cur, season):
+    """
+    Add `season` to the database and move every team to its pre-season elo,
+    once per season. The season's row in the Seasons table records that the
+    regression ran, so a restarted process does not regress the ratings of
+    a season that is under way again.
+    NOTE: Commit must be made after the function returns.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+
+    Returns
+    -------
+    bool
+        True if the season was started by this call.
+    """
+    if not add_season_to_db(cur, season):
+        return False
+    update_pre_season_elo(cur)
+    return True
+
+def last_ingested_week(cur, season):
+    """
+    Last regular season week of `season` whose games are in the Games table.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+    season : int
+        Current season. Would be 2023 for 2023-2024 season.
+
+    Returns
+    -------
+    int
+        0 if no week was ingested yet.
+    """
+    week = cur.execute("""SELECT max(CAST(Weeks.week AS INTEGER)) FROM Games JOIN Weeks
+                       ON Games.week_id = Weeks.id
+                       WHERE Games.season_id = (SELECT id FROM Seasons WHERE season = ?)
+                       and Games.playoffs = 0""", (season_name(season),)).fetchone()[0]
+    return week or 0
 
 def assign_home_away(game):
     """
@@ -75,17 +130,65 @@ def assign_home_away(game):
         game["home"] = "winner"
         game["away"] = "loser"
 
-def set_pregame_spread(games, cur):
+def team_states(cur):
+    """
+    The Elo rating and the for/against diffs of the last game window of
+    every team, read with one query.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+
+    Returns
+    -------
+    dict[str: any]
+        {"rows": {team name or alias: row of the team in the arrays},
+         "elo": np.ndarray with shape (n_teams,),
+         "diffs": np.ndarray with shape (n_teams, len(feature_codec.FEATURES)),
+                  see feature_codec.for_against_diffs, NaN for a team
+                  without a TeamAiData row}
+    """
+    states = cur.execute("""SELECT Teams.id, Teams.elo, TeamAiData.home_team, TeamAiData.windows
+                         FROM Teams LEFT JOIN TeamAiData ON TeamAiData.team_id = Teams.id
+                         ORDER BY Teams.id""").fetchall()
+    row_of = {team_id: row for row, (team_id, _, _, _) in enumerate(states)}
+
+    diffs = np.full((len(states), len(feature_codec.FEATURES)), np.nan)
+    with_data = [row for row, state in enumerate(states) if state[3] is not None]
+    if with_data:
+        windows = feature_codec.unpack_many([states[row][3] for row in with_data])
+        # the row holds both windows of the team's most recent game, the side it played on is used
+        sides = [feature_codec.HOME if states[row][2] == 1 else feature_codec.AWAY for row in with_data]
+        diffs[with_data] = feature_codec.for_against_diffs(windows[np.arange(len(with_data)), sides])
+
+    return {
+        "rows": {name: row_of[team_id] for name, team_id in registry.get(cur)["team_ids"].items()
+                 if team_id in row_of},
+        "elo": np.array([state[1] for state in states], dtype=float),
+        "diffs": diffs,
+    }
+
+def set_pregame_spread(games, cur, states=None):
     """
     Sets pregame spread for upcoming games and add it to
     games as another key entry.
 
+    All games are scored together with the batch functions in `elo_model`.
+
     Parameters
     ----------
     games : list[dict]
         List of dictionaries with game data.
     cur : sqlite cursor object
+    states : dict
+        From `team_states`. Default is None which reads them from `cur`.
     """
+    if not games:
+        return
+
+    travel_table = registry.get(cur)["travel_table"]
+    if states is None:
+        states = team_states(cur)
     for game in games:
         assign_home_away(game)
         if game["home"] == "loser":
@@ -95,91 +198,66 @@ def set_pregame_spread(games, cur):
             game["home_team"] = game["winner"]
             game["away_team"] = game["loser"]
 
-        home_elo = cur.execute("SELECT elo FROM Teams WHERE name = ?", (game["home_team"],)).fetchone()[0]
-        away_elo = cur.execute("SELECT elo FROM Teams WHERE name = ?", (game["away_team"],)).fetchone()[0]
-
         # TODO account for playoffs and implement neutral dest
         game["neutral_dest"] = 'None'
         game["playoffs"] = False
-        pregame_elo_shift = elo_model.pregame_elo_shift(game, cur)
-        home_elo = home_elo + pregame_elo_shift
-        away_elo = away_elo - pregame_elo_shift
-        game["home_pregame_elo"] = home_elo
-        game["away_pregame_elo"] = away_elo
-
-        home_spread = (away_elo - home_elo)/25
-        away_spread = home_spread * -1
-        game["home_spread"] = home_spread
-        game["away_spread"] = away_spread
 
-def set_ai_pregame_spread(games, cur):
+    team_index = travel_table["team_index"]
+    home_idx = np.array([team_index[game["home_team"]] for game in games])
+    away_idx = np.array([team_index[game["away_team"]] for game in games])
+    dest_idx = np.full(len(games), -1)
+    pregame_elo_shift = elo_model.pregame_elo_shift_batch(home_idx, away_idx, dest_idx, travel_table)
+
+    home_rows = [states["rows"][game["home_team"]] for game in games]
+    away_rows = [states["rows"][game["away_team"]] for game in games]
+    home_elo = states["elo"][home_rows] + pregame_elo_shift
+    away_elo = states["elo"][away_rows] - pregame_elo_shift
+    home_spread = (away_elo - home_elo)/25
+
+    stats, own = load_ai_data(cur)
+    for idx, game in enumerate(games):
+        game["home_pregame_elo"] = float(home_elo[idx])
+        game["away_pregame_elo"] = float(away_elo[idx])
+        game["home_spread"] = float(home_spread[idx])
+        game["away_spread"] = float(home_spread[idx] * -1)
+
+def set_ai_pregame_spread(games, cur, states=None):
     """
     Calculates the AI predicted spread and adds it to
     `games` with keys "home_ai_spread" and "away_ai_spread".
 
+    The model inputs of all games are built as one array and scored in
+    one pass.
+
     Parameters
     ----------
     games : list[dict]
         List of dictionaries with game data.
     cur : sqlite cursor object
+    states : dict
+        From `team_states`. Default is None which reads them from `cur`.
     """
-    
-    for game in games:
-        # ensure that home_team has been identified
-        try:
-            game["home_team"]
-            game["away_team"]
-        except KeyError:
-            print("pregame elo needs to be run on games before running set_ai_pregame_spread")
-        
-        home_data = cur.execute("""SELECT TeamAiData.* FROM 
-                                TeamAiData JOIN Teams
-                                on TeamAiData.team_id = Teams.id
-                                WHERE Teams.name = ?""",(game["home_team"],)).fetchall()[0]
-        away_data = cur.execute("""SELECT TeamAiData.* FROM 
-                                TeamAiData JOIN Teams
-                                on TeamAiData.team_id = Teams.id
-                                WHERE Teams.name = ?""",(game["away_team"],)).fetchall()[0]
-        
-        if home_data[2] == 1:
-            home_points_diff = np.mean(home_data[32:46]) - np.mean(home_data[46:60])
-            home_turnover_diff = np.mean(home_data[88:102]) - np.mean(home_data[102:116])
-            home_yard_diff = np.mean(home_data[60:74]) - np.mean(home_data[74:88])
-            home_elo_diff = np.mean(home_data[4:18]) - np.mean(home_data[18:32])
-        else:
-            home_points_diff = np.mean(home_data[145:159]) - np.mean(home_data[159:173])
-            home_turnover_diff = np.mean(home_data[201:215]) - np.mean(home_data[215:229])
-            home_yard_diff = np.mean(home_data[173:187]) - np.mean(home_data[187:201])
-            home_elo_diff = np.mean(home_data[117:131]) - np.mean(home_data[131:145])
-        if away_data[2] == 1:
-            away_points_diff = np.mean(away_data[32:46]) - np.mean(away_data[46:60])
-            away_turnover_diff = np.mean(away_data[88:102]) - np.mean(away_data[102:116])
-            away_yard_diff = np.mean(away_data[60:74]) - np.mean(away_data[74:88])
-            away_elo_diff = np.mean(away_data[4:18]) - np.mean(away_data[18:32])
-        else:
-            away_points_diff = np.mean(away_data[145:159]) - np.mean(away_data[159:173])
-            away_turnover_diff = np.mean(away_data[201:215]) - np.mean(away_data[215:229])
-            away_yard_diff = np.mean(away_data[173:187]) - np.mean(away_data[187:201])
-            away_elo_diff = np.mean(away_data[117:131]) - np.mean(away_data[131:145])
-
-        points_diff_diff = home_points_diff - away_points_diff
-        turnover_diff_diff = home_turnover_diff - away_turnover_diff
-        yards_diff_diff = home_yard_diff - away_yard_diff
-        elo_diff_diff = home_elo_diff - away_elo_diff
-        pred_spread = game["home_spread"]
-
-        input = torch.tensor([[elo_diff_diff,
-                              points_diff_diff,
-                              yards_diff_diff,
-                              turnover_diff_diff,
-                              pred_spread]],
-                            dtype=torch.float32)
-        model = models.v1()
-        model_pred_spread = model(input).item()
+    if not games:
+        return
+
+    # ensure that home_team has been identified
+    if any("home_team" not in game or "away_team" not in game for game in games):
+        print("pregame elo needs to be run on games before running set_ai_pregame_spread")
+    if states is None:
+        states = team_states(cur)
+
+    home_rows = [states["rows"][game["home_team"]] for game in games]
+    away_rows = [states["rows"][game["away_team"]] for game in games]
+    # elo_diff_diff, points_diff_diff, yards_diff_diff, turnover_diff_diff, pred_spread
+    features = np.empty((len(games), len(feature_codec.FEATURES) + 1))
+    features[:, :-1] = states["diffs"][home_rows] - states["diffs"][away_rows]
+    features[:, -1] = [game["home_spread"] for game in games]
+
+    model_pred_spreads = numpy_models.predict(numpy_models.get("v1"), features)
+    for game, model_pred_spread in zip(games, model_pred_spreads.tolist()):
         game["home_ai_spread"] = model_pred_spread
         game["away_ai_spread"] = model_pred_spread * -1
-            
-        
+
 def update_week_games(cur, week, season, local_path=None):
     """
     Scrapes internet for this weeks games and then updates
@@ -207,15 +285,47 @@ def update_week_games(cur, week, season, local_path=None):
         if game["pts_lose"] == '': game["pts_lose"] = '0'
         game["week"] = week
 
+    # elo ratings and game windows of every team, read once for both predictions
+    states = team_states(cur)
+
     # set pregame spread for the elo model
-    set_pregame_spread(upcoming_games, cur)
+    set_pregame_spread(upcoming_games, cur, states)
 
     # update ai-games
-    set_ai_pregame_spread(upcoming_games, cur)
+    set_ai_pregame_spread(upcoming_games, cur, states)
 
     return upcoming_games
 
-def update_inference_data(game, game_id, week, cur):
+def load_ai_data(cur):
+    """
+    The TeamAiData windows of every team, kept with running sums while the
+    games of a week are added.
+
+    Parameters
+    ----------
+    cur : sqlite cursor object
+
+    Returns
+    -------
+    stats : rolling_stats.RollingTeamStats
+        Both windows of each team's row, the home window of team id `t` at
+        index 2*t and the away window at 2*t + 1.
+    own : dict[int: int]
+        Index in `stats` of each team's own window by team id. The row holds
+        both windows of the team's most recent game, so the side the team
+        played on is used.
+    """
+    rows = cur.execute("SELECT team_id, home_team, windows FROM TeamAiData").fetchall()
+    team_ids = np.array([row[0] for row in rows], dtype=np.intp)
+    stats = rolling_stats.RollingTeamStats(2*(team_ids.max(initial=0) + 1))
+    windows = feature_codec.unpack_many([row[2] for row in rows])
+    stats.load(2*team_ids, windows[:, feature_codec.HOME])
+    stats.load(2*team_ids + 1, windows[:, feature_codec.AWAY])
+    own = {team_id: 2*team_id + (feature_codec.HOME if home_team == 1 else feature_codec.AWAY)
+           for team_id, home_team, _ in rows}
+    return stats, own
+
+def update_inference_data(game, game_id, week, windows, cur):
     """
     Updates the InferenceData table in the db with new game data.
 
@@ -227,122 +337,23 @@ def update_inference_data(game, game_id, week, cur):
         Id of the game in the database.
     week : int
         Week of the season that the game occurs in.
+    windows : np.ndarray
+        Own windows of the home and the away team before the game, with
+        shape feature_codec.SHAPE.
     cur : sqlite database cursor
     """
-    update_string = build_inference_update_string("InferenceData", game_id, 14)
-
-    home_ai_data = cur.execute("""SELECT TeamAiData.* 
-                                FROM TeamAiData JOIN Teams on TeamAiData.team_id = Teams.id
-                                WHERE Teams.name = ?""", (game["home_team"],)).fetchall()[0]
-    away_ai_data = cur.execute("""SELECT TeamAiData.* 
-                                FROM TeamAiData JOIN Teams on TeamAiData.team_id = Teams.id
-                                WHERE Teams.name = ?""", (game["away_team"],)).fetchall()[0]
-
-    if home_ai_data[2] == 1:
-        home_elo_for = list(home_ai_data[4:18])
-        home_elo_against = list(home_ai_data[18:32])
-        home_points_for = list(home_ai_data[32:46])
-        home_points_against = list(home_ai_data[46:60])
-        home_yards_for = list(home_ai_data[60:74])
-        home_yards_against = list(home_ai_data[74:88])
-        home_turnovers_for = list(home_ai_data[88:102])
-        home_turnovers_against = list(home_ai_data[102:116])
-    else:
-        home_elo_for = list(home_ai_data[117:131])
-        home_elo_against = list(home_ai_data[131:145])
-        home_points_for = list(home_ai_data[145:159])
-        home_points_against = list(home_ai_data[159:173])
-        home_yards_for = list(home_ai_data[173:187])
-        home_yards_against = list(home_ai_data[187:201])
-        home_turnovers_for = list(home_ai_data[201:215])
-        home_turnovers_against = list(home_ai_data[215:229])
-    if away_ai_data[2] == 1:
-        away_elo_for = list(away_ai_data[4:18])
-        away_elo_against = list(away_ai_data[18:32])
-        away_points_for = list(away_ai_data[32:46])
-        away_points_against = list(away_ai_data[46:60])
-        away_yards_for = list(away_ai_data[60:74])
-        away_yards_against = list(away_ai_data[74:88])
-        away_turnovers_for = list(away_ai_data[88:102])
-        away_turnovers_against = list(away_ai_data[102:116])
-    else:
-        away_elo_for = list(away_ai_data[117:131])
-        away_elo_against = list(away_ai_data[131:145])
-        away_points_for = list(away_ai_data[145:159])
-        away_points_against = list(away_ai_data[159:173])
-        away_yards_for = list(away_ai_data[173:187])
-        away_yards_against = list(away_ai_data[187:201])
-        away_turnovers_for = list(away_ai_data[201:215])
-        away_turnovers_against = list(away_ai_data[215:229])
-
-    cur.execute(update_string, (game_id, game["home_pregame_elo"],
-                                *home_elo_for, *home_elo_against,
-                                *home_points_for, *home_points_against,
-                                *home_yards_for, *home_yards_against,
-                                *home_turnovers_for, *home_turnovers_against,
-                                game["away_pregame_elo"], *away_elo_for,
-                                *away_elo_against, *away_points_for,
-                                *away_points_against, *away_yards_for,
-                                *away_yards_against, *away_turnovers_for,
-                                *away_turnovers_against, week))
-        
-def build_inference_update_string(table_name, game_id, number):
-    """
-    Builds the INSERT string for updating all columns of the `table_name`
-    table in the database.
+    cur.execute("""INSERT OR IGNORE INTO InferenceData
+                (game_id, home_pregame_elo, away_pregame_elo, week_number, windows)
+                VALUES (?, ?, ?, ?, ?)""",
+                (game_id, game["home_pregame_elo"], game["away_pregame_elo"],
+                 week, feature_codec.pack(windows)))
 
-    Parameters
-    ----------
-    table_name : str
-        Name of the table.
-    game_id : int
-        Id of the game in the database.
-    number : int
-        Number of games that are included in the backwards averaging
-        for the ML model. Currently 14.
-
-    Returns
-    -------
-    str
-        INSERT string for updating the `table_name` table in the database.
-    """
-    update_string = f"""INSERT OR IGNORE INTO {table_name}
-                        (game_id, home_pregame_elo"""
-    
-    items = {}
-    items["home_elo_for"] = number
-    items["home_elo_against"] = number
-    items["home_points_for"] = number
-    items["home_points_against"] = number
-    items["home_yards_for"] = number
-    items["home_yards_against"] = number
-    items["home_turnovers_for"] = number
-    items["home_turnovers_against"] = number
-    items["away_pregame_elo"] = 0
-    items["away_elo_for"] = number
-    items["away_elo_against"] = number
-    items["away_points_for"] = number
-    items["away_points_against"] = number
-    items["away_yards_for"] = number
-    items["away_yards_against"] = number
-    items["away_turnovers_for"] = number
-    items["away_turnovers_against"] = number
-    for name, number in items.items():
-        if name == "away_pregame_elo":
-            update_string += f", {name}"
-        for idx in range(1, number+1):
-            update_string += f", {name}_{idx}"
-    update_string += f", week_number) VALUES (?"
-    for idx in range(0,227):
-        update_string += ", ?"
-    update_string += ")"
-    return update_string
-
-def move_prev_week_to_db(cur, conn, week, season, local_path=None):
+def move_prev_week_to_db(cur, week, season, local_path=None):
     """
     Scrapes the internet to get the scores from the previous week
     and adds the data to the db. Also updates
     the elo scores of the teams who played that week.
+    NOTE: Commit must be made after the function returns.
 
     Parameters
     ----------
@@ -354,13 +365,18 @@ def move_prev_week_to_db(cur, conn, week, season, local_path=None):
     local_path : str
         Local path to an html file for debugging.
     """
-    season_name = str(season) + "-" + str(season+1)
-    season_id = cur.execute("SELECT id FROM Seasons WHERE season = ?", (season_name,)).fetchone()[0]
-    week_id = cur.execute("SELECT id FROM Weeks WHERE week = ?", (week,)).fetchone()[0]
+    lookups = registry.get(cur)
+    season_id = lookups["season_ids"][season_name(season)]
+    week_id = lookups["week_ids"][str(week)]
+    # the week's games and their elo update must not be added twice
+    if cur.execute("SELECT 1 FROM Games WHERE season_id = ? and week_id = ? LIMIT 1",
+                   (season_id, week_id)).fetchone():
+        return
     games = update_week_games(cur, week, season, local_path)
+    if not games:
+        return
 
     for game in games:
-        #games table update
         # assign_home_away(game)
         if game["home"] == "loser":
             game["home_team"] = game["loser"]
@@ -381,212 +397,112 @@ def move_prev_week_to_db(cur, conn, week, season, local_path=None):
             game["away_turnovers"] = game["to_lose"]
             game["home_turnovers"] = game["to_win"]
 
-        cur.execute("""INSERT OR IGNORE INTO Games
+    team_ids = lookups["team_ids"]
+    game_ids = []
+    for game in games:
+        #games table update, the pregame elos are set by the elo update
+        cur.execute("""INSERT INTO Games
                     (season_id, week_id, home_team, away_team,
                     home_points, away_points, home_yards,
                     away_yards, home_turnovers, away_turnovers,
                     home_pregame_elo, away_pregame_elo, playoffs,
-                    home_bye, away_bye, neutral_destination) 
-                    VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    home_bye, away_bye, neutral_destination,
+                    home_team_id, away_team_id) 
+                    VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                     (season_id, week_id, game["home_team"], game["away_team"], game["home_points"],
                      game["away_points"], game["home_yards"], game["away_yards"], game["home_turnovers"],
-                     game["away_turnovers"], game["home_pregame_elo"], game["away_pregame_elo"], 0, 0, 0, 'None'))
-        
-        game_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
-
-        # team elo update
-        elo_shift = elo_model.postgame_elo_shift(game, cur)
-        away_elo = game["away_pregame_elo"] - elo_shift
-        home_elo = game["home_pregame_elo"] + elo_shift
-        cur.execute("UPDATE Teams SET elo = ? WHERE name = ?",
-                    (home_elo, game["home_team"]))
-        cur.execute("UPDATE Teams SET elo = ? WHERE name = ?",
-                    (away_elo, game["away_team"]))
-        
-        update_inference_data(game, game_id, week, cur)
-        update_ai_input(game_id, cur)
-        
-        update_ai_data(game["home_team"], 1, game, week, cur)
-        update_ai_data(game["away_team"], 0, game, week, cur)
-
-    conn.commit()
-
-def update_ai_data(team, home, game, week, cur):
+                     game["away_turnovers"], 0, 0, 0, 0, 0, 'None',
+                     team_ids[game["home_team"]], team_ids[game["away_team"]]))
+        game_ids.append(cur.execute("SELECT last_insert_rowid()").fetchone()[0])
+
+    # team elo update through the Elo replay, starting from the current ratings,
+    # which also stores them as the week's checkpoint
+    elo = np.array([elo for (elo,) in cur.execute("SELECT elo FROM Teams ORDER BY id")],
+                   dtype=np.float64)
+    elo_sim.update_games(cur, game_ids, elo)
+    pregame_elo = {game_id: (home, away) for game_id, home, away in cur.execute(
+        f"""SELECT id, home_pregame_elo, away_pregame_elo FROM Games
+        WHERE id IN ({", ".join("?"*len(game_ids))})""", game_ids)}
+
+    stats, own = load_ai_data(cur)
+    for game, game_id in zip(games, game_ids):
+        game["home_pregame_elo"], game["away_pregame_elo"] = pregame_elo[game_id]
+
+        home_id, away_id = team_ids[game["home_team"]], team_ids[game["away_team"]]
+        update_inference_data(game, game_id, week,
+                              np.stack((stats.games(own[home_id]), stats.games(own[away_id]))), cur)
+        update_ai_input(game, game_id, stats.diffs(own[home_id]) - stats.diffs(own[away_id]), cur)
+
+        update_ai_data(home_id, 1, game, week, stats, own, cur)
+        update_ai_data(away_id, 0, game, week, stats, own, cur)
+
+def update_ai_data(team_id, home, game, week, stats, own, cur):
     """
     Updates the TeamAiData table in the database. 
     NOTE: Commit must be made after the function returns.
 
     Parameters
     ----------
-    team : str
-        Name of the team whose data is to be updated.
+    team_id : int
+        Id of the team whose data is to be updated.
     home : bool
-        True if `team` was the hometeam in the most recent game.
+        True if the team was the hometeam in the most recent game.
         Else false.
     game : dict
         Dictionary with game data.
     week : int
         Week that the game was played in.
+    stats : rolling_stats.RollingTeamStats
+        Windows of `load_ai_data`, the game is added to both of the team's.
+    own : dict[int: int]
+        Own windows of `load_ai_data`, updated to the side of the game.
     cur : sqlite cursor object 
     """
-    ai_data = cur.execute("""SELECT TeamAiData.* 
-                            FROM TeamAiData JOIN Teams on TeamAiData.team_id = Teams.id
-                            WHERE Teams.name = ?""", (team,)).fetchall()[0]
-    home_team = 1
-    # get the last 13 of 14 attribute columns
-    home_elo_for = list(ai_data[5:18])
-    home_elo_against = list(ai_data[19:32])
-    home_points_for = list(ai_data[33:46])
-    home_points_against = list(ai_data[47:60])
-    home_yards_for = list(ai_data[61:74])
-    home_yards_against = list(ai_data[75:88])
-    home_turnovers_for = list(ai_data[89:102])
-    home_turnovers_against = list(ai_data[103:116])
-    away_elo_for = list(ai_data[118:131])
-    away_elo_against = list(ai_data[132:145])
-    away_points_for = list(ai_data[146:159])
-    away_points_against = list(ai_data[160:173])
-    away_yards_for = list(ai_data[174:187])
-    away_yards_against = list(ai_data[188:201])
-    away_turnovers_for = list(ai_data[202:215])
-    away_turnovers_against = list(ai_data[216:229])
-    team_id = ai_data[1]
-
-    # get command for updating the db
-    update_string = build_aidata_update_string("TeamAiData", team_id, 14)
-
-    # add the recent game stats to the existing ones
-    home_elo_for.append(game["home_pregame_elo"])
-    home_elo_against.append(game["away_pregame_elo"])
-    home_points_for.append(game["home_points"])
-    home_points_against.append(game["away_points"])
-    home_yards_for.append(game["home_yards"])
-    home_yards_against.append(game["away_yards"])
-    home_turnovers_for.append(game["away_turnovers"])
-    home_turnovers_against.append(game["home_turnovers"])
-    away_elo_for.append(game["away_pregame_elo"])
-    away_elo_against.append(game["home_pregame_elo"])
-    away_points_for.append(game["away_points"])
-    away_points_against.append(game["home_points"])
-    away_yards_for.append(game["away_yards"])
-    away_yards_against.append(game["home_yards"])
-    away_turnovers_for.append(game["home_turnovers"])
-    away_turnovers_against.append(game["away_turnovers"])
+    # stats of the recent game for both sides, in feature_codec.STATS order
+    recent_game = rolling_stats.game_stats(*(int(game[key]) for key in (
+        "home_pregame_elo", "away_pregame_elo", "home_points", "away_points",
+        "home_yards", "away_yards", "home_turnovers", "away_turnovers")))
+
+    # the oldest game drops out of both windows
+    stats.push(2*team_id, recent_game[feature_codec.HOME])
+    stats.push(2*team_id + 1, recent_game[feature_codec.AWAY])
 
     if home: home_team = 1
     else: home_team = 0
+    own[team_id] = 2*team_id + (feature_codec.HOME if home else feature_codec.AWAY)
 
-    cur.execute(update_string, (home_team, game["home_pregame_elo"],
-                                *home_elo_for, *home_elo_against,
-                                *home_points_for, *home_points_against,
-                                *home_yards_for, *home_yards_against,
-                                *home_turnovers_for, *home_turnovers_against,
-                                game["away_pregame_elo"], *away_elo_for,
-                                *away_elo_against, *away_points_for,
-                                *away_points_against, *away_yards_for,
-                                *away_yards_against, *away_turnovers_for,
-                                *away_turnovers_against, week))
-    
+    cur.execute("""UPDATE TeamAiData SET home_team = ?, home_pregame_elo = ?,
+                away_pregame_elo = ?, week_number = ?, windows = ?
+                WHERE team_id = ?""",
+                (home_team, game["home_pregame_elo"], game["away_pregame_elo"], week,
+                 feature_codec.pack(np.stack((stats.games(2*team_id), stats.games(2*team_id + 1)))),
+                 team_id))
 
-def build_aidata_update_string(table_name, team_id, number):
+def update_ai_input(game, game_id, diffs, cur):
     """
-    Builds the INSERT string for updating all columns of the `table_name`
+    Adds the model inputs and the AI spread of a new game to the AiInput
     table in the database.
 
     Parameters
     ----------
-    table_name : str
-        Name of the table.
-    team_id : int
-        Id of the team in the database.
-    number : int
-        Number of games that are included in the backwards averaging
-        for the ML model. Currently 14.
-
-    Returns
-    -------
-    str
-        INSERT string for updating the `table_name` table in the database.
-    """
-    update_string = f"""UPDATE {table_name} SET
-                        team_id = {team_id}, home_team = ?, home_pregame_elo = ?"""
-    
-    items = {}
-    items["home_elo_for"] = number
-    items["home_elo_against"] = number
-    items["home_points_for"] = number
-    items["home_points_against"] = number
-    items["home_yards_for"] = number
-    items["home_yards_against"] = number
-    items["home_turnovers_for"] = number
-    items["home_turnovers_against"] = number
-    items["away_pregame_elo"] = 0
-    items["away_elo_for"] = number
-    items["away_elo_against"] = number
-    items["away_points_for"] = number
-    items["away_points_against"] = number
-    items["away_yards_for"] = number
-    items["away_yards_against"] = number
-    items["away_turnovers_for"] = number
-    items["away_turnovers_against"] = number
-    for name, number in items.items():
-        if name == "away_pregame_elo":
-            update_string += f", {name} = ?"
-        for idx in range(1, number+1):
-            update_string += f", {name}_{idx} = ?"
-    update_string += f", week_number = ? WHERE team_id = {team_id}"
-    return update_string
-
-def update_ai_input(game_id, cur):
-    """
-    Copies new data from the Games and InferenceData tables to
-    the AiInput table in the database.
-
-    Parameters
-    ----------
+    game : dict
+        Dictionary with game data.
     game_id : int
-        Id of the game to have data copied.
+        Id of the game in the database.
+    diffs : np.ndarray
+        For/against diffs of the home team's window minus those of the away
+        team's, see rolling_stats.RollingTeamStats.diffs.
     cur : sqlite cursor object.
     """
-    game = cur.execute("""
-                    SELECT Games.id, Games.home_points, Games.away_points,
-                    Games.home_pregame_elo, Games.away_pregame_elo, InferenceData.*
-                    FROM Games JOIN InferenceData on Games.id = InferenceData.game_id
-                    WHERE Games.id = ?""", (game_id,)).fetchall()
-
-    # load nn model
-    model = models.v1()
-
-    # calculate averages
-    games_df = pd.DataFrame(game)
-
-    games_df["home_point_diff"] = games_df.iloc[:,36:50].mean(axis=1) - games_df.iloc[:,50:64].mean(axis=1)
-    games_df["away_point_diff"] = games_df.iloc[:,149:163].mean(axis=1) - games_df.iloc[:,163:177].mean(axis=1)
-    games_df["point_diff_diff"] = games_df["home_point_diff"] - games_df["away_point_diff"]
-    games_df["home_turnover_diff"] = games_df.iloc[:,92:106].mean(axis=1) - games_df.iloc[:,106:120].mean(axis=1)
-    games_df["away_turnover_diff"] = games_df.iloc[:,205:219].mean(axis=1) - games_df.iloc[:,219:233].mean(axis=1)
-    games_df["turnover_diff_diff"] = games_df["home_turnover_diff"] - games_df["away_turnover_diff"]
-    games_df["home_yard_diff"] = games_df.iloc[:,64:78].mean(axis=1) - games_df.iloc[:,78:92].mean(axis=1)
-    games_df["away_yard_diff"] = games_df.iloc[:,177:191].mean(axis=1) - games_df.iloc[:,191:205].mean(axis=1)
-    games_df["yard_diff_diff"] = games_df["home_yard_diff"] - games_df["away_yard_diff"]
-    games_df["home_elo_diff"] = games_df.iloc[:,8:22].mean(axis=1) - games_df.iloc[:,22:36].mean(axis=1)
-    games_df["away_elo_diff"] = games_df.iloc[:,121:135].mean(axis=1) - games_df.iloc[:,135:149].mean(axis=1)
-    games_df["elo_diff_diff"] = games_df["home_elo_diff"] - games_df["away_elo_diff"]
-    games_df["pred_spread"] = (games_df.iloc[:, 4] - games_df.iloc[:, 3])/25
+    elo_diff_diff, point_diff_diff, yard_diff_diff, turnover_diff_diff = diffs.tolist()
+    pred_spread = (game["away_pregame_elo"] - game["home_pregame_elo"])/25
 
     # populate table
-    input = torch.tensor(games_df[["elo_diff_diff",
-                            "point_diff_diff",
-                            "yard_diff_diff",
-                            "turnover_diff_diff",
-                            "pred_spread"]].to_numpy(dtype=float),
-                            dtype=torch.float32)
-    model_pred = model(input).item()
+    model_pred = numpy_models.predict(numpy_models.get("v1"), [[elo_diff_diff, point_diff_diff, yard_diff_diff,
+                                                                turnover_diff_diff, pred_spread]]).item()
     cur.execute("""INSERT OR IGNORE INTO AiInput 
                 (game_id, ai_spread, elo_diff, point_diff,
                 yard_diff, turnover_diff, elo_pred_spread) Values
                 (?, ?, ?, ?, ?, ?, ?)""",
-                (game_id, model_pred, games_df["elo_diff_diff"].to_numpy()[0],
-                games_df["point_diff_diff"].to_numpy()[0], games_df["yard_diff_diff"].to_numpy()[0],
-                games_df["turnover_diff_diff"].to_numpy()[0], games_df["pred_spread"].to_numpy()[0])
-                )
\ No newline at end of file
+                (game_id, model_pred, elo_diff_diff, point_diff_diff,
+                 yard_diff_diff, turnover_diff_diff, pred_spread))
@@ -0,0 +1,105 @@
+"""
+Process-wide cache of model weights, shared by the torch models in
+`models` and their NumPy counterparts in `numpy_models`.
+
+A WeightCache keeps one instance of each model version. It notices that
+a weight file changed from os.stat alone, so answering from the resident
+model never reads the file. A file that was only touched hashes the same
+and keeps the resident model. A new model is built in full before it
+replaces the cached one, so callers that already hold a model keep a
+consistent set of weights.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+def file_key(path):
+    """
+    What a WeightCache compares to tell that a weight file changed
+    without reading it.
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class WeightCache:
+    """
+    One resident instance per model version, loaded on first use and
+    reloaded after its weight file changed.
+
+    Parameters
+    ----------
+    load : callable
+        load(version, weights) builds a model from the bytes of its
+        weight file.
+    """
+    def __init__(self, load):
+        self.load = load
+        self.lock = threading.Lock()
+        # version: (file_key of the weight file, sha256 of its bytes, model)
+        self.models = {}
+        # number of times weights were read from disk, the seconds spent doing so,
+        # and calls to `get` answered by the resident model
+        self.counts = {"loads": 0, "load_seconds": 0.0, "hits": 0}
+
+    def _resident(self, version, key):
+        cached = self.models.get(version)
+        if cached is not None and cached[0] == key:
+            self.counts["hits"] += 1
+            return cached[2]
+        return None
+
+    def get(self, version, path):
+        """
+        The resident instance of a model version.
+
+        Parameters
+        ----------
+        version : str
+        path : str
+            Weight file of the version.
+
+        Returns
+        -------
+        model
+            What `load` returned. Shared by every caller in the process,
+            do not modify it.
+        """
+        model = self._resident(version, file_key(path))
+        if model is not None:
+            return model
+
+        with self.lock:
+            # another thread may have reloaded it while this one waited
+            key = file_key(path)
+            model = self._resident(version, key)
+            if model is not None:
+                return model
+
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                weights = f.read()
+            digest = hashlib.sha256(weights).hexdigest()
+            cached = self.models.get(version)
+            if cached is not None and cached[1] == digest:
+                model = cached[2]
+            else:
+                model = self.load(version, weights)
+            self.models[version] = (key, digest, model)
+            self.counts["loads"] += 1
+            self.counts["load_seconds"] += time.perf_counter() - start
+            return model
+
+    def counters(self):
+        """
+        Weight loads and cache hits since the process started.
+
+        Returns
+        -------
+        dict[str: number]
+            {"loads": times weights were read from disk,
+             "load_seconds": seconds spent reading and building models,
+             "hits": calls answered by a resident model}
+        """
+        return dict(self.counts)